@@ -1,18 +1,43 @@
 # app.py (corrected full file)
-from flask import Flask, render_template, redirect, url_for, flash, request, jsonify, send_file
-from flask_login import LoginManager, login_user, logout_user, login_required, current_user
+from flask import Flask, render_template, redirect, url_for, flash, request, jsonify, send_file, Response, stream_with_context
+from flask_login import LoginManager, login_user, logout_user, login_required, current_user, login_url
 from werkzeug.security import generate_password_hash
 from functools import wraps
-from datetime import datetime, timedelta
+from datetime import datetime
 from decimal import Decimal
-import csv
-import io
 import os
+import random
+import time
 import urllib.parse
+import click
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 
 from config import Config
-from models import db, User, Product, Category, Customer, Invoice, InvoiceItem, ActivityLog, log_activity
+from models import db, User, Product, Category, Customer, Invoice, InvoiceItem, ActivityLog, ImportJob, DailySales, InventoryValue
+from audit import audit_writer, log_activity
 from pdf_generator import generate_invoice_pdf
+from pdf_cache import pdf_cache
+from invoice_export import count_invoices, stream_invoice_zip
+from receipt import render_escpos, render_text
+from importer import IMPORT_MODES
+from import_jobs import submit_import
+from cache import lookup_barcode, invalidate_barcodes, barcode_index, dashboard_cache, catalog_cache, user_cache, load_cached_user
+from query_stats import query_counter
+from auth_tokens import TokenUser, issue_token, verify_token, revoke_token, revoke_user_tokens
+from catalog_sync import catalog_changes, catalog_etag, serialize_catalog
+from search import get_search_backend
+from idempotency import IdempotencyConflict, find_response, store_response, replay, purge_expired
+from rollups import record_daily_sale, rebuild_daily_sales, sales_summary, sales_series
+from valuation import inventory_values, rebuild_inventory_values
+from invoice_batch import submit_batch
+from checkout import CheckoutError, cart_quantities, load_cart_products, price_cart, reserve_stock, credit_customer, checkout_stats
+from migrations import apply_index_set, applied_index_version, INDEX_SET_VERSION
+from query_plans import check_query_plans, seed_invoices
+from log_partitions import archive_months, convert_to_partitioned, ensure_partitions, is_postgres
+from reports import REPORTS, filter_created_between, stream_csv
+from pagination import DEFAULT_PER_PAGE, InvalidCursor, keyset_paginate, page_total
+from serializers import invoice_load_options, product_load_options, serialize_customers, serialize_counted_customers, with_invoice_counts
 
 app = Flask(__name__)
 app.config.from_object(Config)
@@ -65,6 +90,9 @@ else:
 
 # ----------------------------------------------------------------
 
+audit_writer.init_app(app)
+query_counter.init_app(app)
+
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
@@ -73,12 +101,33 @@ login_manager.login_message_category = 'info'
 
 @login_manager.user_loader
 def load_user(user_id):
-    return db.session.get(User, int(user_id))
+    return load_cached_user(int(user_id))
+
+def bearer_token():
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        return header[7:].strip()
+    return None
+
+@login_manager.request_loader
+def load_user_from_request(request):
+    # API clients without a session cookie authenticate with a signed bearer token
+    token = bearer_token()
+    return verify_token(token) if token else None
+
+@login_manager.unauthorized_handler
+def unauthorized():
+    if bearer_token():
+        return jsonify({'error': 'Invalid, expired or revoked token'}), 401
+    flash(login_manager.login_message, login_manager.login_message_category)
+    return redirect(login_url(login_manager.login_view, next_url=request.url))
 
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if not current_user.is_authenticated or not current_user.is_admin():
+            if bearer_token():
+                return jsonify({'error': 'Admin access required'}), 403
             flash('Admin access required.', 'error')
             return redirect(url_for('dashboard'))
         return f(*args, **kwargs)
@@ -87,6 +136,13 @@ def admin_required(f):
 def init_db():
     with app.app_context():
         db.create_all()
+        apply_index_set()
+        ensure_partitions()
+        get_search_backend()
+        if Invoice.query.first() and not DailySales.query.first():
+            rebuild_daily_sales()
+        if Product.query.first() and not InventoryValue.query.first():
+            rebuild_inventory_values()
         if not User.query.filter_by(username='admin').first():
             admin_password = os.environ.get('ADMIN_PASSWORD', 'admin123')
             cashier_password = os.environ.get('CASHIER_PASSWORD', 'cashier123')
@@ -201,6 +257,42 @@ def login():
     
     return render_template('login.html')
 
+@app.route('/api/auth/token', methods=['POST'])
+def api_auth_token():
+    data = request.get_json(silent=True) or {}
+    user = User.query.filter_by(username=data.get('username', '')).first()
+    
+    if not user or not user.check_password(data.get('password', '')):
+        return jsonify({'error': 'Invalid username or password'}), 401
+    if not user.is_active:
+        return jsonify({'error': 'Your account has been deactivated'}), 403
+    
+    log_activity(user.id, 'API_TOKEN_ISSUE', 'Bearer token issued', request.remote_addr)
+    return jsonify({**issue_token(user), 'user': {'id': user.id, 'username': user.username, 'role': user.role}})
+
+@app.route('/api/auth/revoke', methods=['POST'])
+@login_required
+def api_auth_revoke():
+    data = request.get_json(silent=True) or {}
+    
+    # Admins can retire every token of a user, e.g. a lost terminal's account
+    if data.get('user_id') is not None:
+        if not current_user.is_admin():
+            return jsonify({'error': 'Admin access required'}), 403
+        try:
+            user_id = int(data['user_id'])
+        except (TypeError, ValueError):
+            return jsonify({'error': 'user_id must be an integer'}), 400
+        revoke_user_tokens(user_id)
+        log_activity(current_user.id, 'API_TOKEN_REVOKE', f'All tokens of user {user_id} revoked', request.remote_addr)
+        return jsonify({'success': True, 'user_id': user_id})
+    
+    if not isinstance(current_user._get_current_object(), TokenUser):
+        return jsonify({'error': 'Send the token to revoke as a Bearer Authorization header'}), 400
+    revoke_token(current_user)
+    log_activity(current_user.id, 'API_TOKEN_REVOKE', 'Bearer token revoked', request.remote_addr)
+    return jsonify({'success': True})
+
 @app.route('/logout')
 @login_required
 def logout():
@@ -213,24 +305,7 @@ def logout():
 @login_required
 def dashboard():
     today = datetime.utcnow().date()
-    week_ago = today - timedelta(days=7)
-    month_start = today.replace(day=1)
-    
-    today_sales = db.session.query(db.func.sum(Invoice.total_amount)).filter(
-        db.func.date(Invoice.created_at) == today
-    ).scalar() or 0
-    
-    weekly_sales = db.session.query(db.func.sum(Invoice.total_amount)).filter(
-        db.func.date(Invoice.created_at) >= week_ago
-    ).scalar() or 0
-    
-    monthly_sales = db.session.query(db.func.sum(Invoice.total_amount)).filter(
-        db.func.date(Invoice.created_at) >= month_start
-    ).scalar() or 0
-    
-    today_invoices = Invoice.query.filter(
-        db.func.date(Invoice.created_at) == today
-    ).count()
+    sales = sales_summary(today)
     
     total_products = Product.query.filter_by(is_active=True).count()
     low_stock_count = Product.query.filter(
@@ -240,22 +315,22 @@ def dashboard():
     
     total_customers = Customer.query.count()
     
-    low_stock_products = Product.query.filter(
+    low_stock_products = Product.query.options(*product_load_options()).filter(
         Product.is_active == True,
         Product.quantity <= Config.LOW_STOCK_THRESHOLD
     ).order_by(Product.quantity.asc()).limit(10).all()
     
-    recent_invoices = Invoice.query.order_by(Invoice.created_at.desc()).limit(10).all()
+    recent_invoices = Invoice.query.options(*invoice_load_options(items=False)).order_by(Invoice.created_at.desc()).limit(10).all()
     
-    recent_activities = ActivityLog.query.order_by(
+    recent_activities = ActivityLog.query.options(joinedload(ActivityLog.user)).order_by(
         ActivityLog.created_at.desc()
     ).limit(10).all()
     
     return render_template('dashboard.html',
-        today_sales=float(today_sales),
-        weekly_sales=float(weekly_sales),
-        monthly_sales=float(monthly_sales),
-        today_invoices=today_invoices,
+        today_sales=float(sales['today_sales']),
+        weekly_sales=float(sales['weekly_sales']),
+        monthly_sales=float(sales['monthly_sales']),
+        today_invoices=sales['today_invoices'],
         total_products=total_products,
         low_stock_count=low_stock_count,
         total_customers=total_customers,
@@ -267,32 +342,60 @@ def dashboard():
 @app.route('/pos')
 @login_required
 def pos():
-    products = Product.query.filter_by(is_active=True).filter(Product.quantity > 0).all()
+    # Products and customers are fetched page by page from the API by pos.js
     categories = Category.query.all()
-    customers = Customer.query.order_by(Customer.name).all()
-    return render_template('pos.html', products=products, categories=categories, customers=customers)
+    return render_template('pos.html', categories=categories)
 
-@app.route('/products')
-@login_required
-def products():
-    page = request.args.get('page', 1, type=int)
-    search = request.args.get('search', '')
-    category_id = request.args.get('category', type=int)
-    
-    query = Product.query
+def keyset_page(query, model, columns, descending=False, filtered=False, per_page=DEFAULT_PER_PAGE, count='approx'):
+    # HTML listings: a stale or hand-edited cursor just falls back to the first page
+    total, is_estimate = page_total(query, model, count, filtered)
+    try:
+        page = keyset_paginate(query, columns, descending, request.args.get('cursor'), per_page)
+    except InvalidCursor:
+        page = keyset_paginate(query, columns, descending, None, per_page)
+    page.total, page.total_is_estimate = total, is_estimate
+    return page
+
+def api_page(query, model, columns, descending=False, filtered=False):
+    # JSON listings: ?cursor=, ?per_page= and ?count=exact|approx; a bad cursor raises InvalidCursor (400)
+    total, is_estimate = page_total(query, model, request.args.get('count'), filtered)
+    page = keyset_paginate(
+        query, columns, descending,
+        request.args.get('cursor'),
+        request.args.get('per_page', DEFAULT_PER_PAGE, type=int)
+    )
+    page.total, page.total_is_estimate = total, is_estimate
+    return page
+
+@app.errorhandler(InvalidCursor)
+def invalid_cursor(e):
+    return jsonify({'error': str(e)}), 400
+
+def product_list_query(search='', category_id=None, active_only=False, in_stock=False):
+    query = Product.query.options(*product_load_options())
     
     if search:
-        query = query.filter(
-            db.or_(
-                Product.name.ilike(f'%{search}%'),
-                Product.barcode.ilike(f'%{search}%')
-            )
-        )
+        query = query.filter(get_search_backend().filter(search))
     
     if category_id:
         query = query.filter_by(category_id=category_id)
     
-    products = query.order_by(Product.name).paginate(page=page, per_page=20)
+    if active_only:
+        query = query.filter(Product.is_active == True)
+    
+    if in_stock:
+        query = query.filter(Product.quantity > 0)
+    
+    return query
+
+@app.route('/products')
+@login_required
+def products():
+    search = request.args.get('search', '')
+    category_id = request.args.get('category', type=int)
+    
+    query = product_list_query(search, category_id)
+    products = keyset_page(query, Product, [Product.name, Product.id], filtered=bool(search or category_id))
     categories = Category.query.all()
     
     return render_template('products.html', products=products, categories=categories, search=search, selected_category=category_id)
@@ -329,6 +432,7 @@ def add_product():
         
         db.session.add(product)
         db.session.commit()
+        invalidate_barcodes(product.barcode)
         
         log_activity(current_user.id, 'PRODUCT_ADD', f'Added product: {name}', request.remote_addr)
         flash('Product added successfully!', 'success')
@@ -354,6 +458,7 @@ def edit_product(id):
         product.is_active = request.form.get('is_active') == 'on'
         
         db.session.commit()
+        invalidate_barcodes(product.barcode)
         
         log_activity(current_user.id, 'PRODUCT_EDIT', f'Edited product: {product.name}', request.remote_addr)
         flash('Product updated successfully!', 'success')
@@ -369,6 +474,7 @@ def delete_product(id):
     product = Product.query.get_or_404(id)
     product.is_active = False
     db.session.commit()
+    invalidate_barcodes(product.barcode)
     
     log_activity(current_user.id, 'PRODUCT_DELETE', f'Deleted product: {product.name}', request.remote_addr)
     flash('Product deleted successfully!', 'success')
@@ -392,55 +498,47 @@ def import_products():
             flash('Please upload a CSV file!', 'error')
             return redirect(url_for('import_products'))
         
+        mode = request.form.get('mode', 'insert')
+        if mode not in IMPORT_MODES:
+            flash('Unknown import mode!', 'error')
+            return redirect(url_for('import_products'))
+        
         try:
-            stream = io.StringIO(file.stream.read().decode('UTF8'), newline=None)
-            reader = csv.DictReader(stream)
-            
-            imported = 0
-            for row in reader:
-                category = None
-                if 'category' in row and row['category']:
-                    category = Category.query.filter_by(name=row['category']).first()
-                    if not category:
-                        category = Category(name=row['category'])
-                        db.session.add(category)
-                        db.session.flush()
-                
-                barcode = row.get('barcode') or Product.generate_barcode()
-                if Product.query.filter_by(barcode=barcode).first():
-                    barcode = Product.generate_barcode()
-                
-                product = Product(
-                    name=row['name'],
-                    barcode=barcode,
-                    category_id=category.id if category else None,
-                    price=Decimal(row.get('price', 0)),
-                    cost_price=Decimal(row.get('cost_price', 0)),
-                    quantity=int(row.get('quantity', 0)),
-                    unit=row.get('unit', 'piece'),
-                    description=row.get('description', '')
-                )
-                db.session.add(product)
-                imported += 1
-            
-            db.session.commit()
-            log_activity(current_user.id, 'PRODUCT_IMPORT', f'Imported {imported} products', request.remote_addr)
-            flash(f'Successfully imported {imported} products!', 'success')
-            return redirect(url_for('products'))
-            
+            job = submit_import(app, file, mode, current_user.id, request.remote_addr)
         except Exception as e:
             db.session.rollback()
             flash(f'Error importing file: {str(e)}', 'error')
             return redirect(url_for('import_products'))
+        
+        flash('Import started. You can leave this page; progress is saved as it runs.', 'info')
+        return redirect(url_for('import_job', job_id=job.id))
     
-    return render_template('import_products.html')
+    recent_jobs = ImportJob.query.order_by(ImportJob.created_at.desc()).limit(10).all()
+    return render_template('import_products.html', recent_jobs=recent_jobs)
 
-@app.route('/customers')
+@app.route('/products/import/<job_id>')
 @login_required
-def customers():
-    page = request.args.get('page', 1, type=int)
-    search = request.args.get('search', '')
-    
+@admin_required
+def import_job(job_id):
+    job = ImportJob.query.get_or_404(job_id)
+    return render_template('import_job.html', job=job)
+
+@app.route('/products/import/<job_id>/rejects')
+@login_required
+@admin_required
+def import_job_rejects(job_id):
+    job = ImportJob.query.get_or_404(job_id)
+    if not job.rejects_path or not os.path.exists(job.rejects_path):
+        flash('No rejected rows for this import.', 'info')
+        return redirect(url_for('import_job', job_id=job.id))
+    return send_file(
+        job.rejects_path,
+        as_attachment=True,
+        download_name=f'{os.path.splitext(job.filename or "import")[0]}-rejects.csv',
+        mimetype='text/csv'
+    )
+
+def customer_list_query(search=''):
     query = Customer.query
     
     if search:
@@ -451,7 +549,15 @@ def customers():
             )
         )
     
-    customers = query.order_by(Customer.name).paginate(page=page, per_page=20)
+    return query
+
+@app.route('/customers')
+@login_required
+def customers():
+    search = request.args.get('search', '')
+    
+    query = customer_list_query(search)
+    customers = keyset_page(query, Customer, [Customer.name, Customer.id], filtered=bool(search))
     
     return render_template('customers.html', customers=customers, search=search)
 
@@ -491,15 +597,11 @@ def view_customer(id):
     invoices = Invoice.query.filter_by(customer_id=id).order_by(Invoice.created_at.desc()).all()
     return render_template('view_customer.html', customer=customer, invoices=invoices)
 
-@app.route('/invoices')
-@login_required
-def invoices():
-    page = request.args.get('page', 1, type=int)
-    search = request.args.get('search', '')
-    date_from = request.args.get('date_from', '')
-    date_to = request.args.get('date_to', '')
+def invoice_list_query(search='', date_from='', date_to='', customer_id=None, items=False):
+    query = Invoice.query.options(*invoice_load_options(items=items))
     
-    query = Invoice.query
+    if customer_id:
+        query = query.filter(Invoice.customer_id == customer_id)
     
     if search:
         query = query.join(Customer, isouter=True).filter(
@@ -510,62 +612,86 @@ def invoices():
             )
         )
     
-    if date_from:
-        query = query.filter(Invoice.created_at >= datetime.strptime(date_from, '%Y-%m-%d'))
-    
-    if date_to:
-        query = query.filter(Invoice.created_at <= datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1))
+    return filter_created_between(query, Invoice.created_at, date_from, date_to)
+
+@app.route('/invoices')
+@login_required
+def invoices():
+    search = request.args.get('search', '')
+    date_from = request.args.get('date_from', '')
+    date_to = request.args.get('date_to', '')
     
-    invoices = query.order_by(Invoice.created_at.desc()).paginate(page=page, per_page=20)
+    try:
+        query = invoice_list_query(search, date_from, date_to)
+    except ValueError:
+        flash('Dates must be YYYY-MM-DD.', 'error')
+        return redirect(url_for('invoices'))
+    invoices = keyset_page(
+        query, Invoice, [Invoice.created_at, Invoice.id],
+        descending=True, filtered=bool(search or date_from or date_to)
+    )
     
     return render_template('invoices.html', invoices=invoices, search=search, date_from=date_from, date_to=date_to)
 
 @app.route('/invoices/<int:id>')
 @login_required
 def view_invoice(id):
-    invoice = Invoice.query.get_or_404(id)
+    invoice = Invoice.query.options(*invoice_load_options()).get_or_404(id)
     return render_template('view_invoice.html', invoice=invoice)
 
 @app.route('/invoices/<int:id>/pdf')
 @login_required
 def download_invoice_pdf(id):
-    invoice = Invoice.query.get_or_404(id)
-    pdf_buffer = generate_invoice_pdf(invoice)
+    # Items are only loaded when the PDF is not cached yet
+    invoice = Invoice.query.options(*invoice_load_options(items=False)).get_or_404(id)
+    path, _ = pdf_cache.get_or_render(invoice, lambda: generate_invoice_pdf(invoice))
     return send_file(
-        pdf_buffer,
+        path,
         as_attachment=True,
         download_name=f'{invoice.invoice_number}.pdf',
         mimetype='application/pdf'
     )
 
+@app.route('/invoices/<int:id>/receipt')
+@login_required
+def invoice_receipt(id):
+    invoice = Invoice.query.options(*invoice_load_options()).get_or_404(id)
+    width = request.args.get('width', Config.RECEIPT_WIDTH, type=int)
+    if not 24 <= width <= 64:
+        return jsonify({'error': 'width must be between 24 and 64 columns'}), 400
+    
+    if request.args.get('format') == 'escpos':
+        return Response(
+            render_escpos(invoice, width),
+            mimetype='application/octet-stream',
+            headers={'Content-Disposition': f'attachment; filename={invoice.invoice_number}.bin'}
+        )
+    return Response(render_text(invoice, width), mimetype='text/plain')
+
 @app.route('/inventory')
 @login_required
 def inventory():
-    page = request.args.get('page', 1, type=int)
     filter_type = request.args.get('filter', 'all')
     
-    query = Product.query.filter_by(is_active=True)
+    query = Product.query.options(*product_load_options()).filter_by(is_active=True)
     
     if filter_type == 'low_stock':
         query = query.filter(Product.quantity <= Config.LOW_STOCK_THRESHOLD)
     elif filter_type == 'out_of_stock':
         query = query.filter(Product.quantity == 0)
     
-    products = query.order_by(Product.quantity.asc()).paginate(page=page, per_page=20)
-    
-    total_stock_value = db.session.query(
-        db.func.sum(Product.quantity * Product.price)
-    ).filter(Product.is_active == True).scalar() or 0
+    # Always filtered: the table-wide estimate would count inactive products too
+    products = keyset_page(query, Product, [Product.quantity, Product.id], filtered=True)
     
-    total_cost_value = db.session.query(
-        db.func.sum(Product.quantity * Product.cost_price)
-    ).filter(Product.is_active == True).scalar() or 0
+    # Read from the inventory_values rollup (one row per category), not aggregated over products
+    totals, category_values = inventory_values()
     
     return render_template('inventory.html', 
         products=products, 
         filter_type=filter_type,
-        total_stock_value=float(total_stock_value),
-        total_cost_value=float(total_cost_value)
+        total_stock_value=totals['stock_value'],
+        total_cost_value=totals['cost_value'],
+        category_values=category_values
     )
 
 @app.route('/inventory/update/<int:id>', methods=['POST'])
@@ -580,6 +706,7 @@ def update_stock(id):
         product.quantity = 0
     
     db.session.commit()
+    invalidate_barcodes(product.barcode)
     
     log_activity(current_user.id, 'STOCK_UPDATE', f'Updated stock for {product.name}: {adjustment:+d}', request.remote_addr)
     flash('Stock updated successfully!', 'success')
@@ -591,13 +718,42 @@ def update_stock(id):
 def reports():
     return render_template('reports.html')
 
+def activity_log_query(user_id=None, action='', date_from='', date_to=''):
+    # A created_at range lets PostgreSQL prune to the matching monthly partitions
+    query = ActivityLog.query.options(joinedload(ActivityLog.user))
+    
+    if user_id:
+        query = query.filter(ActivityLog.user_id == user_id)
+    
+    if action:
+        query = query.filter(ActivityLog.action == action)
+    
+    return filter_created_between(query, ActivityLog.created_at, date_from, date_to)
+
 @app.route('/activity-logs')
 @login_required
 @admin_required
 def activity_logs():
-    page = request.args.get('page', 1, type=int)
-    logs = ActivityLog.query.order_by(ActivityLog.created_at.desc()).paginate(page=page, per_page=50)
-    return render_template('activity_logs.html', logs=logs)
+    user_id = request.args.get('user_id', type=int)
+    action = request.args.get('action', '').strip().upper()
+    date_from = request.args.get('date_from', '')
+    date_to = request.args.get('date_to', '')
+    
+    try:
+        query = activity_log_query(user_id, action, date_from, date_to)
+    except ValueError:
+        flash('Dates must be YYYY-MM-DD.', 'error')
+        return redirect(url_for('activity_logs'))
+    
+    # Show entries still sitting in the writer's buffer too
+    audit_writer.flush(timeout=2)
+    logs = keyset_page(
+        query, ActivityLog, [ActivityLog.created_at, ActivityLog.id],
+        descending=True, filtered=bool(user_id or action or date_from or date_to), per_page=50
+    )
+    users = User.query.order_by(User.username).all()
+    return render_template('activity_logs.html', logs=logs, users=users,
+        user_id=user_id, action=action, date_from=date_from, date_to=date_to)
 
 @app.route('/users')
 @login_required
@@ -639,27 +795,45 @@ def add_user():
 @app.route('/api/products', methods=['GET'])
 @login_required
 def api_products():
-    products = Product.query.filter_by(is_active=True).all()
-    return jsonify([p.to_dict() for p in products])
+    etag = catalog_etag()
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        body, _ = catalog_cache.get_or_compute(etag, serialize_catalog)
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@app.route('/api/products/changes', methods=['GET'])
+@login_required
+def api_product_changes():
+    changes = catalog_changes(request.args.get('since'), request.args.get('limit', type=int))
+    return jsonify(changes)
 
 @app.route('/api/products/search', methods=['GET'])
 @login_required
 def api_search_products():
-    query = request.args.get('q', '')
-    products = Product.query.filter(
-        Product.is_active == True,
-        db.or_(
-            Product.name.ilike(f'%{query}%'),
-            Product.barcode.ilike(f'%{query}%')
-        )
-    ).limit(20).all()
+    query = request.args.get('q', '').strip()
+    if query:
+        products = get_search_backend().search(query, limit=20)
+    else:
+        products = Product.query.options(*product_load_options()).filter(Product.is_active == True).limit(20).all()
     return jsonify([p.to_dict() for p in products])
 
+@app.route('/api/products/barcode/<path:barcode>', methods=['GET'])
+@login_required
+def api_product_by_barcode(barcode):
+    product = lookup_barcode(barcode)
+    if product is None:
+        return jsonify({'error': 'Product not found'}), 404
+    return jsonify(product)
+
 @app.route('/api/customers', methods=['GET'])
 @login_required
 def api_customers():
-    customers = Customer.query.all()
-    return jsonify([c.to_dict() for c in customers])
+    rows = with_invoice_counts(Customer.query).all()
+    return jsonify(serialize_counted_customers(rows))
 
 @app.route('/api/customers/search', methods=['GET'])
 @login_required
@@ -671,137 +845,203 @@ def api_search_customers():
             Customer.mobile.ilike(f'%{query}%')
         )
     ).limit(10).all()
-    return jsonify([c.to_dict() for c in customers])
+    return jsonify(serialize_customers(customers))
+
+@app.route('/api/products/page', methods=['GET'])
+@login_required
+def api_products_page():
+    search = request.args.get('q', '').strip()
+    category_id = request.args.get('category', type=int)
+    in_stock = request.args.get('in_stock') == '1'
+    
+    query = product_list_query(search, category_id, active_only=True, in_stock=in_stock)
+    page = api_page(query, Product, [Product.name, Product.id], filtered=True)
+    return jsonify({'items': [p.to_dict() for p in page.items], **page.meta()})
+
+@app.route('/api/customers/page', methods=['GET'])
+@login_required
+def api_customers_page():
+    search = request.args.get('q', '').strip()
+    
+    query = customer_list_query(search)
+    page = api_page(query, Customer, [Customer.name, Customer.id], filtered=bool(search))
+    return jsonify({'items': serialize_customers(page.items), **page.meta()})
+
+@app.route('/api/invoices', methods=['GET'])
+@login_required
+def api_invoices():
+    search = request.args.get('search', '').strip()
+    date_from = request.args.get('date_from', '')
+    date_to = request.args.get('date_to', '')
+    customer_id = request.args.get('customer_id', type=int)
+    
+    try:
+        query = invoice_list_query(search, date_from, date_to, customer_id, items=True)
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    page = api_page(
+        query, Invoice, [Invoice.created_at, Invoice.id],
+        descending=True, filtered=bool(search or date_from or date_to or customer_id)
+    )
+    return jsonify({'items': [invoice.to_dict() for invoice in page.items], **page.meta()})
+
+@app.route('/api/activity-logs', methods=['GET'])
+@login_required
+@admin_required
+def api_activity_logs():
+    user_id = request.args.get('user_id', type=int)
+    action = request.args.get('action', '').strip().upper()
+    date_from = request.args.get('date_from', '')
+    date_to = request.args.get('date_to', '')
+    
+    try:
+        query = activity_log_query(user_id, action, date_from, date_to)
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    
+    audit_writer.flush(timeout=2)
+    page = api_page(
+        query, ActivityLog, [ActivityLog.created_at, ActivityLog.id],
+        descending=True, filtered=bool(user_id or action or date_from or date_to)
+    )
+    return jsonify({'items': [log.to_dict() for log in page.items], **page.meta()})
 
 @app.route('/api/invoice/create', methods=['POST'])
 @login_required
 def api_create_invoice():
     data = request.get_json()
+    idempotency_key = request.headers.get('Idempotency-Key')
+    if idempotency_key and len(idempotency_key) > 100:
+        return jsonify({'error': 'Idempotency-Key is too long'}), 400
     
     try:
+        if idempotency_key:
+            stored = find_response(idempotency_key, current_user.id, 'invoice_create')
+            if stored:
+                return replay(*stored)
+        
         customer_id = data.get('customer_id')
-        items = data.get('items', [])
         discount_percent = Decimal(str(data.get('discount_percent', 0)))
         payment_method = data.get('payment_method', 'cash')
         notes = data.get('notes', '')
         
-        if not items:
-            return jsonify({'error': 'No items in cart'}), 400
+        quantities = cart_quantities(data.get('items', []))
+        products = load_cart_products(quantities)
+        lines, totals = price_cart(quantities, products, discount_percent)
         
-        subtotal = Decimal('0')
-        invoice_items = []
-        
-        for item in items:
-            product = Product.query.get(item['product_id'])
-            if not product:
-                return jsonify({'error': f'Product not found: {item["product_id"]}'}), 400
-            
-            if product.quantity < item['quantity']:
-                return jsonify({'error': f'Insufficient stock for {product.name}'}), 400
-            
-            item_total = product.price * item['quantity']
-            subtotal += item_total
-            
-            invoice_items.append({
-                'product': product,
-                'quantity': item['quantity'],
-                'unit_price': product.price,
-                'total_price': item_total
-            })
-        
-        tax_rate = Decimal(str(Config.TAX_RATE * 100))
-        tax_amount = subtotal * Decimal(str(Config.TAX_RATE))
-        discount_amount = subtotal * (discount_percent / Decimal('100'))
-        total_amount = subtotal + tax_amount - discount_amount
+        # Numbered before any write so a block reservation never waits on this transaction
+        invoice_number = Invoice.generate_invoice_number()
+        reserve_stock(quantities, products)
         
         invoice = Invoice(
-            invoice_number=Invoice.generate_invoice_number(),
+            invoice_number=invoice_number,
             customer_id=customer_id,
             created_by=current_user.id,
-            subtotal=subtotal,
-            tax_amount=tax_amount,
-            tax_rate=tax_rate,
-            discount_amount=discount_amount,
-            discount_percent=discount_percent,
-            total_amount=total_amount,
             payment_method=payment_method,
-            notes=notes
+            notes=notes,
+            **totals
         )
         
         db.session.add(invoice)
         db.session.flush()
         
-        for item_data in invoice_items:
-            invoice_item = InvoiceItem(
-                invoice_id=invoice.id,
-                product_id=item_data['product'].id,
-                product_name=item_data['product'].name,
-                quantity=item_data['quantity'],
-                unit_price=item_data['unit_price'],
-                total_price=item_data['total_price']
-            )
-            db.session.add(invoice_item)
-            
-            item_data['product'].quantity -= item_data['quantity']
+        db.session.add_all([InvoiceItem(invoice_id=invoice.id, **line) for line in lines])
         
         if customer_id:
-            customer = Customer.query.get(customer_id)
-            if customer:
-                customer.total_purchases += total_amount
-                customer.loyalty_points += int(total_amount / 100)
+            credit_customer(customer_id, totals['total_amount'])
         
+        record_daily_sale(invoice)
+        
+        result = {
+            'success': True,
+            'invoice': invoice.to_dict()
+        }
+        if idempotency_key:
+            store_response(idempotency_key, current_user.id, 'invoice_create', result)
+        
+        # Read before the commit expires the products, which would reload each one
+        barcodes = [products[product_id].barcode for product_id in quantities]
         db.session.commit()
+        invalidate_barcodes(*barcodes)
         
         log_activity(current_user.id, 'INVOICE_CREATE', 
-            f'Created invoice: {invoice.invoice_number}, Total: {total_amount}', 
+            f'Created invoice: {invoice_number}, Total: {totals["total_amount"]}', 
             request.remote_addr)
+        if idempotency_key:
+            purge_expired()
         
-        return jsonify({
-            'success': True,
-            'invoice': invoice.to_dict()
-        })
+        return jsonify(result)
+    
+    except CheckoutError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    
+    except IdempotencyConflict as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 422
+    
+    except IntegrityError as e:
+        db.session.rollback()
+        # A concurrent retry with the same key committed first; answer with its result
+        stored = find_response(idempotency_key, current_user.id, 'invoice_create') if idempotency_key else None
+        if stored:
+            return replay(*stored)
+        return jsonify({'error': str(e)}), 500
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/invoices/batch', methods=['POST'])
+@login_required
+def api_create_invoices_batch():
+    data = request.get_json(silent=True) or {}
+    carts = data.get('invoices')
+    if not isinstance(carts, list) or not carts:
+        return jsonify({'error': 'invoices must be a non-empty list'}), 400
+    if len(carts) > Config.INVOICE_BATCH_MAX:
+        return jsonify({'error': f'At most {Config.INVOICE_BATCH_MAX} invoices per batch'}), 400
+    
+    try:
+        entries, created, barcodes = submit_batch(carts, current_user.id)
+    except Exception as e:
+        # Groups committed before the failure stay committed; carts sent with an
+        # idempotency_key replay their result when the till retries the batch
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+    
+    invalidate_barcodes(*barcodes)
+    for entry in created:
+        log_activity(current_user.id, 'INVOICE_CREATE', 
+            f'Created invoice: {entry.result["invoice"]["invoice_number"]}, Total: {entry.totals["total_amount"]} (batch)', 
+            request.remote_addr)
+    if any(entry.key for entry in created):
+        purge_expired()
+    
+    results = [entry.result for entry in entries]
+    return jsonify({
+        'success': True,
+        'results': results,
+        'created': sum(1 for r in results if r['status'] == 'created'),
+        'replayed': sum(1 for r in results if r['status'] == 'replayed'),
+        'failed': sum(1 for r in results if r['status'] == 'error')
+    })
+
 @app.route('/api/invoice/<int:id>', methods=['GET'])
 @login_required
 def api_get_invoice(id):
-    invoice = Invoice.query.get_or_404(id)
+    invoice = Invoice.query.options(*invoice_load_options()).get_or_404(id)
     return jsonify(invoice.to_dict())
 
-@app.route('/api/dashboard/stats', methods=['GET'])
+@app.route('/api/import-jobs/<job_id>', methods=['GET'])
 @login_required
-def api_dashboard_stats():
-    today = datetime.utcnow().date()
-    
-    daily_sales = []
-    for i in range(7):
-        date = today - timedelta(days=i)
-        sales = db.session.query(db.func.sum(Invoice.total_amount)).filter(
-            db.func.date(Invoice.created_at) == date
-        ).scalar() or 0
-        daily_sales.append({
-            'date': date.strftime('%Y-%m-%d'),
-            'day': date.strftime('%a'),
-            'sales': float(sales)
-        })
-    daily_sales.reverse()
-    
-    monthly_sales = []
-    for i in range(6):
-        month_start = (today.replace(day=1) - timedelta(days=i*30)).replace(day=1)
-        month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-        sales = db.session.query(db.func.sum(Invoice.total_amount)).filter(
-            Invoice.created_at >= month_start,
-            Invoice.created_at <= month_end
-        ).scalar() or 0
-        monthly_sales.append({
-            'month': month_start.strftime('%b %Y'),
-            'sales': float(sales)
-        })
-    monthly_sales.reverse()
+@admin_required
+def api_import_job(job_id):
+    job = ImportJob.query.get_or_404(job_id)
+    return jsonify(job.to_dict())
+
+def compute_dashboard_stats(today):
+    daily_sales, monthly_sales = sales_series(today)
     
     top_products = db.session.query(
         Product.name,
@@ -810,23 +1050,52 @@ def api_dashboard_stats():
         db.desc('total_qty')
     ).limit(5).all()
     
-    out_of_stock = Product.query.filter(
-        Product.is_active == True,
-        Product.quantity == 0
-    ).count()
-    
-    low_stock = Product.query.filter(
-        Product.is_active == True,
-        Product.quantity > 0,
-        Product.quantity <= Config.LOW_STOCK_THRESHOLD
-    ).count()
+    out_of_stock, low_stock = db.session.query(
+        db.func.count(db.case((Product.quantity == 0, 1))),
+        db.func.count(db.case((db.and_(Product.quantity > 0, Product.quantity <= Config.LOW_STOCK_THRESHOLD), 1)))
+    ).filter(Product.is_active == True).one()
     
-    return jsonify({
+    return {
         'daily_sales': daily_sales,
         'monthly_sales': monthly_sales,
         'top_products': [{'name': p[0], 'quantity': p[1]} for p in top_products],
         'out_of_stock': out_of_stock,
         'low_stock': low_stock
+    }
+
+@app.route('/api/dashboard/stats', methods=['GET'])
+@login_required
+def api_dashboard_stats():
+    today = datetime.utcnow().date()
+    
+    def compute():
+        started = time.perf_counter()
+        stats = compute_dashboard_stats(today)
+        return stats, (time.perf_counter() - started) * 1000
+    
+    (stats, compute_ms), hit = dashboard_cache.get_or_compute(today.isoformat(), compute)
+    
+    response = jsonify(stats)
+    response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+    response.headers['X-Compute-Time-Ms'] = f'{compute_ms:.1f}'
+    response.headers['X-Cache-Hit-Ratio'] = f'{dashboard_cache.hit_ratio():.3f}'
+    return response
+
+@app.route('/api/metrics', methods=['GET'])
+@login_required
+@admin_required
+def api_metrics():
+    return jsonify({
+        'checkout': checkout_stats.to_dict(),
+        'caches': {
+            'barcode_index': barcode_index.stats(),
+            'dashboard_stats': dashboard_cache.stats(),
+            'catalog': catalog_cache.stats(),
+            'invoice_pdfs': pdf_cache.stats(),
+            'users': user_cache.stats()
+        },
+        'audit_log': audit_writer.stats(),
+        'queries': query_counter.stats()
     })
 
 @app.route('/api/reports/export', methods=['GET'])
@@ -837,66 +1106,46 @@ def export_report():
     date_from = request.args.get('date_from', '')
     date_to = request.args.get('date_to', '')
     
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    if report_type == 'sales':
-        query = Invoice.query
-        if date_from:
-            query = query.filter(Invoice.created_at >= datetime.strptime(date_from, '%Y-%m-%d'))
-        if date_to:
-            query = query.filter(Invoice.created_at <= datetime.strptime(date_to, '%Y-%m-%d'))
-        
-        invoices = query.order_by(Invoice.created_at.desc()).all()
-        
-        writer.writerow(['Invoice Number', 'Date', 'Customer', 'Subtotal', 'Tax', 'Discount', 'Total', 'Payment Method'])
-        for inv in invoices:
-            writer.writerow([
-                inv.invoice_number,
-                inv.created_at.strftime('%Y-%m-%d %H:%M'),
-                inv.customer.name if inv.customer else 'Walk-in',
-                float(inv.subtotal),
-                float(inv.tax_amount),
-                float(inv.discount_amount),
-                float(inv.total_amount),
-                inv.payment_method
-            ])
-    
-    elif report_type == 'inventory':
-        products = Product.query.filter_by(is_active=True).order_by(Product.name).all()
-        
-        writer.writerow(['Barcode', 'Name', 'Category', 'Price', 'Cost Price', 'Quantity', 'Stock Value'])
-        for p in products:
-            writer.writerow([
-                p.barcode,
-                p.name,
-                p.category.name if p.category else '',
-                float(p.price),
-                float(p.cost_price),
-                p.quantity,
-                float(p.price * p.quantity)
-            ])
-    
-    elif report_type == 'customers':
-        customers = Customer.query.order_by(Customer.name).all()
-        
-        writer.writerow(['Name', 'Mobile', 'Email', 'Total Purchases', 'Loyalty Points', 'Invoice Count'])
-        for c in customers:
-            writer.writerow([
-                c.name,
-                c.mobile,
-                c.email or '',
-                float(c.total_purchases),
-                c.loyalty_points,
-                c.invoices.count()
-            ])
-    
-    output.seek(0)
-    return send_file(
-        io.BytesIO(output.getvalue().encode('utf-8')),
-        as_attachment=True,
-        download_name=f'{report_type}_report_{datetime.now().strftime("%Y%m%d")}.csv',
-        mimetype='text/csv'
+    report = REPORTS.get(report_type)
+    if not report:
+        return jsonify({'error': f'Unknown report type: {report_type}'}), 400
+    
+    # Build the query up front so bad dates fail before the response starts streaming
+    try:
+        header, stmt, format_row = report(date_from, date_to)
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    filename = f'{report_type}_report_{datetime.now().strftime("%Y%m%d")}.csv'
+    return Response(
+        stream_with_context(stream_csv(header, stmt, format_row)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@app.route('/api/invoices/pdf-export', methods=['GET'])
+@login_required
+@admin_required
+def export_invoice_pdfs():
+    date_from = request.args.get('date_from', '')
+    date_to = request.args.get('date_to', '')
+    
+    try:
+        count = count_invoices(date_from, date_to)
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    if count == 0:
+        return jsonify({'error': 'No invoices in this date range'}), 404
+    if count > Config.PDF_EXPORT_MAX_INVOICES:
+        return jsonify({
+            'error': f'{count} invoices in this range; narrow it to at most {Config.PDF_EXPORT_MAX_INVOICES} or use the export-invoice-pdfs command'
+        }), 400
+    
+    log_activity(current_user.id, 'INVOICE_PDF_EXPORT', f'{count} invoices, {date_from or "start"} to {date_to or "now"}', request.remote_addr)
+    filename = f'invoices_{date_from or "start"}_{date_to or datetime.now().strftime("%Y-%m-%d")}.zip'
+    return Response(
+        stream_with_context(stream_invoice_zip(date_from, date_to)),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
     )
 
 @app.context_processor
@@ -906,6 +1155,150 @@ def utility_processor():
         'config': Config
     }
 
+@app.cli.command('rebuild-daily-sales')
+@click.option('--since', default=None, help='Only rebuild days from this date (YYYY-MM-DD).')
+def rebuild_daily_sales_command(since):
+    """Backfill or rebuild the daily_sales rollup from the invoices table."""
+    since_date = datetime.strptime(since, '%Y-%m-%d').date() if since else None
+    days = rebuild_daily_sales(since_date)
+    print(f'daily_sales rebuilt: {days} days')
+
+@app.cli.command('reconcile-inventory-values')
+def reconcile_inventory_values_command():
+    """Recompute the inventory_values rollup from products and report any drift."""
+    drift = rebuild_inventory_values()
+    for key, (stored, actual) in sorted(drift.items()):
+        print(f'category {key}: stored {stored[0]}/{stored[1]}, actual {actual[0]}/{actual[1]}')
+    print(f'inventory_values reconciled: {len(drift)} categories corrected')
+
+@app.cli.command('bench-search')
+@click.option('--queries', default=1000, help='Number of searches to run.')
+def bench_search(queries):
+    """Time product searches with name prefixes sampled from the catalog."""
+    backend = get_search_backend()
+    names = [name for (name,) in db.session.query(Product.name).limit(5000)]
+    if not names:
+        print('No products to search.')
+        return
+    
+    timings = []
+    for _ in range(queries):
+        name = random.choice(names)
+        term = name[:random.randint(3, max(3, min(len(name), 8)))]
+        started = time.perf_counter()
+        backend.search(term, limit=20)
+        timings.append((time.perf_counter() - started) * 1000)
+    
+    timings.sort()
+    print(f'Backend: {backend.name}, products: {Product.query.count()}, queries: {queries}')
+    print(f'p50: {timings[len(timings) // 2]:.2f}ms  p99: {timings[int(len(timings) * 0.99) - 1]:.2f}ms  max: {timings[-1]:.2f}ms')
+
+@app.cli.command('bench-receipts')
+@click.option('--invoices', default=200, help='Number of recent invoices to render.')
+def bench_receipts(invoices):
+    """Compare thermal receipt rendering with the A4 PDF for recent invoices."""
+    rows = Invoice.query.options(*invoice_load_options()).order_by(Invoice.created_at.desc()).limit(invoices).all()
+    if not rows:
+        print('No invoices to render.')
+        return
+    
+    renderers = [
+        ('text', render_text),
+        ('escpos', render_escpos),
+        ('pdf', lambda invoice: generate_invoice_pdf(invoice).getvalue()),
+    ]
+    print(f'Invoices: {len(rows)}, receipt width: {Config.RECEIPT_WIDTH}')
+    for name, render in renderers:
+        render(rows[0])
+        timings = []
+        for invoice in rows:
+            started = time.perf_counter()
+            render(invoice)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        print(f'{name:>6}  p50: {timings[len(timings) // 2]:.3f}ms  p99: {timings[int(len(timings) * 0.99) - 1]:.3f}ms  max: {timings[-1]:.3f}ms')
+
+@app.cli.command('apply-indexes')
+@click.option('--force', is_flag=True, help='Re-check every index, not just newer versions.')
+def apply_indexes_command(force):
+    """Create any missing indexes from the managed index set."""
+    created = apply_index_set(force=force)
+    for name in created:
+        print(f'created {name}')
+    print(f'Index set at version {applied_index_version()} (latest {INDEX_SET_VERSION})')
+
+@app.cli.command('seed-invoices')
+@click.option('--count', default=1000000, help='Number of invoices to generate.')
+@click.option('--batch-size', default=5000, help='Invoices inserted per transaction.')
+def seed_invoices_command(count, batch_size):
+    """Fill the database with synthetic invoices for query plan checks."""
+    started = time.perf_counter()
+    seed_invoices(count, batch_size=batch_size)
+    rebuild_inventory_values()
+    print(f'Seeded {count} invoices in {time.perf_counter() - started:.1f}s')
+
+@app.cli.command('check-query-plans')
+@click.option('--verbose', is_flag=True, help='Print the full plan for every query.')
+def check_query_plans_command(verbose):
+    """EXPLAIN the hot queries and fail if any of them does a sequential scan."""
+    results = check_query_plans()
+    for result in results:
+        print(f"{'ok  ' if result['ok'] else 'SCAN'} {result['name']}")
+        if verbose or not result['ok']:
+            for line in result['plan']:
+                print(f'       {line}')
+    if not all(result['ok'] for result in results):
+        raise SystemExit(1)
+
+@app.cli.command('partition-activity-logs')
+def partition_activity_logs_command():
+    """Convert activity_logs into a monthly partitioned table (PostgreSQL only)."""
+    if not is_postgres():
+        print('Native partitioning needs PostgreSQL; other databases rely on the created_at indexes and archive-activity-logs.')
+        return
+    audit_writer.flush()
+    moved = convert_to_partitioned()
+    apply_index_set(force=True)
+    print(f'activity_logs partitioned by month, {moved} rows moved')
+
+@app.cli.command('ensure-log-partitions')
+@click.option('--months-ahead', default=None, type=int, help='Months of future partitions to keep ready.')
+def ensure_log_partitions_command(months_ahead):
+    """Create upcoming monthly activity_logs partitions."""
+    for name in ensure_partitions(months_ahead):
+        print(f'created {name}')
+
+@app.cli.command('archive-activity-logs')
+@click.option('--keep-months', default=None, type=int, help='Months of activity logs to keep online.')
+@click.option('--dry-run', is_flag=True, help='Only report what would be archived.')
+def archive_activity_logs_command(keep_months, dry_run):
+    """Move activity logs older than the retention window into gzip CSV archives."""
+    results = archive_months(keep_months, dry_run=dry_run)
+    for result in results:
+        target = result['path'] or ('(dry run)' if dry_run else '(empty partition dropped)')
+        print(f"{result['month']}: {result['rows']} rows -> {target}")
+    if not results:
+        print('Nothing to archive.')
+
+@app.cli.command('export-invoice-pdfs')
+@click.option('--date-from', default='', help='First day to include (YYYY-MM-DD).')
+@click.option('--date-to', default='', help='Last day to include (YYYY-MM-DD).')
+@click.option('--output', required=True, type=click.Path(dir_okay=False), help='ZIP file to write.')
+@click.option('--workers', default=None, type=int, help='Render processes (default: one per CPU).')
+def export_invoice_pdfs_command(date_from, date_to, output, workers):
+    """Render the invoices in a date range to PDF in parallel and write them to a ZIP file."""
+    count = count_invoices(date_from, date_to)
+    started = time.perf_counter()
+    with open(output, 'wb') as f:
+        for chunk in stream_invoice_zip(date_from, date_to, workers):
+            f.write(chunk)
+    print(f'Exported {count} invoices to {output} in {time.perf_counter() - started:.1f}s')
+
+@app.cli.command('clear-pdf-cache')
+def clear_pdf_cache_command():
+    """Delete every cached invoice PDF."""
+    print(f'Removed {pdf_cache.clear()} cached PDFs')
+
 if __name__ == '__main__':
     # only initialize sample DB in development
     env = os.environ.get('FLASK_ENV', 'development')
@@ -0,0 +1,185 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from config import Config
+from models import db, ActivityLog
+from models import log_activity as log_activity_sync
+
+_STOP = object()
+MAX_WRITE_ATTEMPTS = 3
+
+
+class _FlushMarker:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class AuditWriter:
+    # Activity-log rows are queued in memory and written by a background thread in
+    # batches, so a request does not pay for a second commit after its own
+    def __init__(self, mode='async', batch_size=200, flush_interval=1.0, max_buffer=10000):
+        self.mode = mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.app = None
+        self._queue = queue.Queue(maxsize=max_buffer)
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.sync_writes = 0
+        self.failed_batches = 0
+        self.dropped = 0
+
+    def init_app(self, app):
+        self.app = app
+        atexit.register(self.shutdown)
+
+    def _count(self, **deltas):
+        with self._stats_lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def _ensure_thread(self):
+        # Started lazily and per process, so a worker forked after import gets its own writer
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.max_buffer)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+
+    def log(self, user_id, action, details=None, ip_address=None):
+        if self.mode != 'async' or self.app is None:
+            self._write_sync(user_id, action, details, ip_address)
+            return
+        record = {
+            'user_id': user_id,
+            'action': action,
+            'details': details,
+            'ip_address': ip_address,
+            'created_at': datetime.utcnow()
+        }
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(record)
+            self._count(enqueued=1)
+        except queue.Full:
+            # Back-pressure instead of losing audit rows when the writer falls behind
+            self._write_sync(user_id, action, details, ip_address)
+
+    def _write_sync(self, user_id, action, details, ip_address):
+        log_activity_sync(user_id, action, details, ip_address)
+        self._count(sync_writes=1)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, markers = [], []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                if isinstance(item, _FlushMarker):
+                    markers.append(item)
+                    break
+                batch.append(item)
+
+            if stopping:
+                batch.extend(self._drain())
+            if batch:
+                self._write(batch)
+            for marker in markers:
+                marker.done.set()
+
+    def _drain(self):
+        items = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return items
+            if isinstance(item, _FlushMarker):
+                item.done.set()
+            elif item is not _STOP:
+                items.append(item)
+
+    def _write(self, batch):
+        for attempt in range(1, MAX_WRITE_ATTEMPTS + 1):
+            try:
+                with self.app.app_context():
+                    db.session.execute(ActivityLog.__table__.insert(), batch)
+                    db.session.commit()
+                self._count(written=len(batch), batches=1)
+                return
+            except Exception as e:
+                self._count(failed_batches=1)
+                print(f"[WARNING] Activity log batch of {len(batch)} failed (attempt {attempt}): {e}")
+                time.sleep(0.1 * attempt)
+        self._count(dropped=len(batch))
+
+    def flush(self, timeout=5):
+        if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+            return True
+        marker = _FlushMarker()
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.done.wait(timeout)
+
+    def shutdown(self, timeout=10):
+        # Drains whatever is queued before the process exits
+        thread = self._thread
+        if thread is None or not thread.is_alive() or self._pid != os.getpid():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        thread.join(timeout)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'mode': self.mode,
+                'queued': self._queue.qsize(),
+                'enqueued': self.enqueued,
+                'written': self.written,
+                'batches': self.batches,
+                'sync_writes': self.sync_writes,
+                'failed_batches': self.failed_batches,
+                'dropped': self.dropped
+            }
+
+
+audit_writer = AuditWriter(
+    mode=Config.AUDIT_LOG_MODE,
+    batch_size=Config.AUDIT_BATCH_SIZE,
+    flush_interval=Config.AUDIT_FLUSH_INTERVAL,
+    max_buffer=Config.AUDIT_MAX_BUFFER
+)
+
+
+def log_activity(user_id, action, details=None, ip_address=None):
+    audit_writer.log(user_id, action, details, ip_address)
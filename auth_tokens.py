@@ -0,0 +1,145 @@
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask_login import UserMixin
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+
+from config import Config
+from models import db, on_commit, User, RevokedToken
+
+serializer = URLSafeTimedSerializer(Config.SECRET_KEY, salt='api-token')
+
+
+class TokenUser(UserMixin):
+    # current_user for bearer-token requests, built from the signed claims without a query
+    def __init__(self, user_id, username, role, jti, issued_at):
+        self.id = user_id
+        self.username = username
+        self.role = role
+        self.jti = jti
+        self.issued_at = issued_at
+
+    def is_admin(self):
+        return self.role == 'admin'
+
+
+class TokenRevocations:
+    # Revoked tokens live in the revoked_tokens table so every worker sees them; each process
+    # keeps an in-memory copy and reloads it at most every `refresh` seconds
+    def __init__(self, refresh):
+        self.refresh = refresh
+        self._lock = threading.Lock()
+        self._jtis = set()
+        self._users = {}
+        self._loaded_at = None
+
+    def reload(self):
+        rows = db.session.query(RevokedToken.jti, RevokedToken.user_id, RevokedToken.revoked_at).filter(
+            RevokedToken.expires_at > datetime.utcnow()
+        ).all()
+        jtis, users = set(), {}
+        for jti, user_id, revoked_at in rows:
+            if jti:
+                jtis.add(jti)
+            elif user_id is not None:
+                users[user_id] = max(revoked_at, users.get(user_id, revoked_at))
+        with self._lock:
+            self._jtis, self._users, self._loaded_at = jtis, users, time.monotonic()
+
+    def is_revoked(self, jti, user_id, issued_at):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.refresh:
+            self.reload()
+        with self._lock:
+            if jti in self._jtis:
+                return True
+            revoked_at = self._users.get(user_id)
+        return revoked_at is not None and issued_at <= revoked_at
+
+    def add_token(self, jti):
+        with self._lock:
+            self._jtis.add(jti)
+
+    def add_user(self, user_id, revoked_at):
+        with self._lock:
+            self._users[user_id] = max(revoked_at, self._users.get(user_id, revoked_at))
+
+
+revocations = TokenRevocations(Config.API_TOKEN_REVOCATION_REFRESH)
+
+
+def issue_token(user):
+    claims = {
+        'uid': user.id,
+        'usr': user.username,
+        'role': user.role,
+        'jti': secrets.token_urlsafe(12),
+        # Sub-second issue time so a token issued right after a revocation stays valid
+        'iat': time.time()
+    }
+    return {
+        'token': serializer.dumps(claims),
+        'token_type': 'Bearer',
+        'expires_in': Config.API_TOKEN_TTL
+    }
+
+
+def verify_token(token):
+    try:
+        claims = serializer.loads(token, max_age=Config.API_TOKEN_TTL)
+        issued_at = datetime.utcfromtimestamp(claims['iat'])
+        user = TokenUser(claims['uid'], claims['usr'], claims['role'], claims['jti'], issued_at)
+    except (BadSignature, KeyError, TypeError, ValueError):
+        return None
+    if revocations.is_revoked(user.jti, user.id, user.issued_at):
+        return None
+    return user
+
+
+def revoke_token(token_user):
+    db.session.add(RevokedToken(
+        jti=token_user.jti,
+        user_id=token_user.id,
+        expires_at=token_user.issued_at + timedelta(seconds=Config.API_TOKEN_TTL)
+    ))
+    db.session.commit()
+    revocations.add_token(token_user.jti)
+
+
+def revocation_row(user_id):
+    revoked_at = datetime.utcnow()
+    return {
+        'jti': None,
+        'user_id': user_id,
+        'revoked_at': revoked_at,
+        'expires_at': revoked_at + timedelta(seconds=Config.API_TOKEN_TTL)
+    }
+
+
+def revoke_user_tokens(user_id):
+    row = revocation_row(user_id)
+    db.session.execute(RevokedToken.__table__.insert(), row)
+    db.session.commit()
+    revocations.add_user(user_id, row['revoked_at'])
+
+
+def _revoke_in_flush(connection, target):
+    # The row joins the flushing transaction, and this process only treats the tokens as revoked
+    # once that commits, so a rollback leaves them valid
+    row = revocation_row(target.id)
+    connection.execute(RevokedToken.__table__.insert(), row)
+    on_commit(object_session(target), lambda: revocations.add_user(row['user_id'], row['revoked_at']))
+
+
+def _user_changed(mapper, connection, target):
+    # Tokens carry the role, so a role, status or password change has to retire them
+    state = db.inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in ('role', 'is_active', 'password_hash')):
+        _revoke_in_flush(connection, target)
+
+
+event.listen(User, 'after_update', _user_changed)
+event.listen(User, 'after_delete', lambda mapper, connection, target: _revoke_in_flush(connection, target))
@@ -0,0 +1,235 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+from config import Config
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import make_transient_to_detached, object_session
+
+from models import db, on_commit, Product, SharedCacheEntry, User
+
+_MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, ttl, maxsize=None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self._data.pop(key, None)
+            return _MISSING
+        return entry[1]
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._lookup(key)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def get_or_compute(self, key, compute):
+        # Returns (value, hit); concurrent misses for one key wait for a single compute()
+        with self._lock:
+            value = self._lookup(key)
+            if value is _MISSING:
+                key_lock = self._inflight.setdefault(key, threading.Lock())
+        if value is not _MISSING:
+            self._count(hit=True)
+            return value, True
+
+        with key_lock:
+            try:
+                with self._lock:
+                    value = self._lookup(key)
+                if value is _MISSING:
+                    value, hit = self.fill(key, compute)
+                else:
+                    hit = True
+            finally:
+                # The value is stored by now, so later misses can start from a fresh lock
+                with self._lock:
+                    if self._inflight.get(key) is key_lock:
+                        del self._inflight[key]
+        self._count(hit=hit)
+        return value, hit
+
+    def fill(self, key, compute):
+        value = compute()
+        self.set(key, value)
+        return value, False
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {
+            'entries': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hit_ratio(), 3)
+        }
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data.pop(key, None)
+            if self.maxsize and len(self._data) >= self.maxsize:
+                # Dicts keep insertion order, so the first key is the oldest entry
+                self._data.pop(next(iter(self._data)))
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SharedTTLCache(TTLCache):
+    # Misses are coordinated across worker processes through the shared_cache table: the worker
+    # that inserts the key's row computes the value, the others poll the row for it. A claim
+    # left behind by a crashed worker expires after the lease. Values must be JSON-serializable.
+    def __init__(self, name, ttl, maxsize=None, lease=None, poll_interval=0.05):
+        super().__init__(ttl, maxsize)
+        self.name = name
+        self.lease = lease if lease is not None else Config.SHARED_CACHE_LEASE
+        self.poll_interval = poll_interval
+
+    def fill(self, key, compute):
+        shared_key = f'{self.name}:{key}'
+        while True:
+            found = self.read_shared(shared_key)
+            if found is not None:
+                value, remaining = found
+                self.set(key, value, ttl=min(remaining, self.ttl))
+                return value, True
+            if self.claim(shared_key):
+                break
+            time.sleep(self.poll_interval)
+
+        try:
+            value = compute()
+        except Exception:
+            self.release(shared_key)
+            raise
+        self.write_shared(shared_key, value)
+        self.set(key, value)
+        return value, False
+
+    def read_shared(self, shared_key):
+        table = SharedCacheEntry.__table__
+        with db.engine.connect() as conn:
+            row = conn.execute(
+                db.select(table.c.value, table.c.expires_at).where(table.c.key == shared_key)
+            ).first()
+        if row is None or row.value is None:
+            return None
+        remaining = (row.expires_at - datetime.utcnow()).total_seconds()
+        return (json.loads(row.value), remaining) if remaining > 0 else None
+
+    def claim(self, shared_key):
+        # The primary key lets only one worker insert the pending row; expired rows, including
+        # those of other keys such as earlier days, are cleared first
+        table = SharedCacheEntry.__table__
+        now = datetime.utcnow()
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(table.delete().where(table.c.expires_at < now))
+                conn.execute(table.insert().values(
+                    key=shared_key, value=None, expires_at=now + timedelta(seconds=self.lease)
+                ))
+        except IntegrityError:
+            return False
+        return True
+
+    def write_shared(self, shared_key, value):
+        table = SharedCacheEntry.__table__
+        with db.engine.begin() as conn:
+            conn.execute(table.update().where(table.c.key == shared_key).values(
+                value=json.dumps(value),
+                expires_at=datetime.utcnow() + timedelta(seconds=self.ttl)
+            ))
+
+    def release(self, shared_key):
+        table = SharedCacheEntry.__table__
+        with db.engine.begin() as conn:
+            conn.execute(table.delete().where(table.c.key == shared_key, table.c.value.is_(None)))
+
+
+barcode_index = TTLCache(ttl=Config.BARCODE_CACHE_TTL, maxsize=Config.BARCODE_CACHE_SIZE)
+dashboard_cache = SharedTTLCache('dashboard_stats', ttl=Config.DASHBOARD_STATS_TTL)
+# Serialized /api/products bodies keyed by catalog ETag; a new ETag simply misses
+catalog_cache = TTLCache(ttl=Config.CATALOG_CACHE_TTL, maxsize=4)
+# Detached User rows for the login loader; other workers see role/status changes within the TTL
+user_cache = TTLCache(ttl=Config.USER_CACHE_TTL, maxsize=Config.USER_CACHE_SIZE)
+
+
+def lookup_barcode(barcode):
+    product = barcode_index.get(barcode)
+    if product is None:
+        row = Product.query.filter_by(barcode=barcode, is_active=True).first()
+        if row is None:
+            return None
+        product = row.to_dict()
+        barcode_index.set(barcode, product)
+    return product
+
+
+def invalidate_barcodes(*barcodes):
+    for barcode in barcodes:
+        barcode_index.delete(barcode)
+
+
+def load_cached_user(user_id):
+    def load():
+        # A fresh detached copy rather than the session's instance, so it can be shared across
+        # requests without being expired by commits or bound to a closed session
+        row = db.session.execute(db.select(*User.__table__.c).where(User.id == user_id)).mappings().first()
+        if row is None:
+            return None
+        user = User(**row)
+        make_transient_to_detached(user)
+        return user
+
+    user, _ = user_cache.get_or_compute(user_id, load)
+    return user
+
+
+def invalidate_user(user_id):
+    user_cache.delete(user_id)
+
+
+def _user_changed(mapper, connection, target):
+    # Again after commit: a request that reloads the row between flush and commit still reads the
+    # old version and would otherwise cache it for the whole TTL
+    user_id = target.id
+    invalidate_user(user_id)
+    on_commit(object_session(target), lambda: invalidate_user(user_id))
+
+
+for action in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(User, action, _user_changed)
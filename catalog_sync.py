@@ -0,0 +1,48 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from config import Config
+from models import db, Product, Category
+from pagination import encode_cursor, decode_cursor
+from serializers import product_load_options
+
+SYNC_KEY = [Product.updated_at, Product.id]
+
+
+def catalog_etag():
+    # Every product write bumps updated_at (soft deletes included), so the row count, the newest
+    # updated_at and the category names identify the catalog without serializing it
+    count, latest, top = db.session.query(
+        db.func.count(Product.id), db.func.max(Product.updated_at), db.func.max(Product.id)
+    ).one()
+    categories = db.session.query(Category.id, Category.name).order_by(Category.id).all()
+    state = repr((count, latest.isoformat() if latest else None, top, [tuple(c) for c in categories]))
+    return hashlib.sha256(state.encode()).hexdigest()[:32]
+
+
+def serialize_catalog():
+    products = Product.query.options(*product_load_options()).filter_by(is_active=True).order_by(Product.id).all()
+    return json.dumps([p.to_dict() for p in products], separators=(',', ':'))
+
+
+def catalog_changes(cursor=None, limit=None):
+    limit = max(1, min(limit or Config.CATALOG_SYNC_PAGE_SIZE, Config.CATALOG_SYNC_PAGE_SIZE))
+    settled = datetime.utcnow() - timedelta(seconds=Config.CATALOG_SYNC_SETTLE_SECONDS)
+
+    query = Product.query.options(*product_load_options()).filter(Product.updated_at <= settled)
+    if cursor:
+        values, _ = decode_cursor(cursor, SYNC_KEY)
+        bound = db.tuple_(*[db.literal(value, column.type) for column, value in zip(SYNC_KEY, values)])
+        query = query.filter(db.tuple_(*SYNC_KEY) > bound)
+    rows = query.order_by(*SYNC_KEY).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    # Deactivated products come back as tombstones so terminals can drop them
+    return {
+        'products': [p.to_dict() for p in rows if p.is_active],
+        'deleted': [p.id for p in rows if not p.is_active],
+        'next_cursor': encode_cursor([rows[-1].updated_at, rows[-1].id]) if rows else cursor,
+        'has_more': has_more
+    }
@@ -0,0 +1,136 @@
+import threading
+import time
+
+from decimal import Decimal
+
+from sqlalchemy import case, func
+
+from config import Config
+from models import db, Product, Customer
+from valuation import record_stock_sold
+
+
+class CheckoutError(Exception):
+    pass
+
+
+class CheckoutStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reservations = 0
+        self.oversells_prevented = 0
+        self.lock_waits = 0
+        self.lock_wait_ms = 0.0
+
+    def record(self, elapsed_ms, oversold=False):
+        with self._lock:
+            self.reservations += 1
+            if oversold:
+                self.oversells_prevented += 1
+            if elapsed_ms >= Config.LOCK_WAIT_THRESHOLD_MS:
+                self.lock_waits += 1
+                self.lock_wait_ms += elapsed_ms
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'reservations': self.reservations,
+                'oversells_prevented': self.oversells_prevented,
+                'lock_waits': self.lock_waits,
+                'lock_wait_ms': round(self.lock_wait_ms, 1)
+            }
+
+
+checkout_stats = CheckoutStats()
+
+
+def cart_quantities(items):
+    quantities = {}
+    for item in items:
+        try:
+            product_id = int(item['product_id'])
+            quantity = int(item['quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise CheckoutError('Invalid cart item')
+        if quantity <= 0:
+            raise CheckoutError('Quantity must be positive')
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    if not quantities:
+        raise CheckoutError('No items in cart')
+    return quantities
+
+
+def load_cart_products(quantities):
+    products = {p.id: p for p in Product.query.filter(Product.id.in_(quantities)).all()}
+    for product_id, quantity in quantities.items():
+        product = products.get(product_id)
+        if not product:
+            raise CheckoutError(f'Product not found: {product_id}')
+        if product.quantity < quantity:
+            raise CheckoutError(f'Insufficient stock for {product.name}')
+    return products
+
+
+def price_cart(quantities, products, discount_percent):
+    # Plain line dicts rather than ORM objects, so pricing survives a commit that expires the products
+    lines = []
+    subtotal = Decimal('0')
+    for product_id, quantity in quantities.items():
+        product = products[product_id]
+        total_price = product.price * quantity
+        subtotal += total_price
+        lines.append({
+            'product_id': product.id,
+            'product_name': product.name,
+            'quantity': quantity,
+            'unit_price': product.price,
+            'total_price': total_price
+        })
+
+    tax_amount = subtotal * Decimal(str(Config.TAX_RATE))
+    discount_amount = subtotal * (discount_percent / Decimal('100'))
+    totals = {
+        'subtotal': subtotal,
+        'tax_rate': Decimal(str(Config.TAX_RATE * 100)),
+        'tax_amount': tax_amount,
+        'discount_percent': discount_percent,
+        'discount_amount': discount_amount,
+        'total_amount': subtotal + tax_amount - discount_amount
+    }
+    return lines, totals
+
+
+def reserve_stock(quantities, products):
+    # One conditional UPDATE for the whole cart: every row must still have enough stock,
+    # otherwise fewer rows match and the caller rolls the checkout back.
+    table = Product.__table__
+    demand = case(quantities, value=table.c.id)
+    stmt = table.update().where(
+        table.c.id.in_(sorted(quantities)),
+        table.c.quantity >= demand
+    ).values(quantity=table.c.quantity - demand)
+
+    started = time.perf_counter()
+    result = db.session.execute(stmt)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    oversold = result.rowcount != len(quantities)
+    checkout_stats.record(elapsed_ms, oversold=oversold)
+    if oversold:
+        current = dict(db.session.query(Product.id, Product.quantity).filter(Product.id.in_(quantities)))
+        short = [pid for pid, quantity in quantities.items() if current.get(pid, 0) < quantity]
+        name = products[short[0]].name if short else 'an item in the cart'
+        raise CheckoutError(f'Insufficient stock for {name}')
+
+    record_stock_sold(quantities)
+    for product_id in quantities:
+        db.session.expire(products[product_id], ['quantity'])
+
+
+def credit_customer(customer_id, total_amount, points=None):
+    # points defaults to one per Rs. 100 of this sale; batches pass the sum over their invoices
+    table = Customer.__table__
+    db.session.execute(table.update().where(table.c.id == customer_id).values(
+        total_purchases=func.coalesce(table.c.total_purchases, 0) + total_amount,
+        loyalty_points=func.coalesce(table.c.loyalty_points, 0) + (int(total_amount / 100) if points is None else points)
+    ))
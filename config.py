@@ -1,4 +1,5 @@
 import os
+import tempfile
 from datetime import timedelta
 
 class Config:
@@ -20,6 +21,73 @@ class Config:
     # File upload limits
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024
     
+    # Product CSV import
+    IMPORT_CHUNK_SIZE = 1000
+    IMPORT_WORKERS = 2
+    IMPORT_JOB_DIR = os.environ.get('IMPORT_JOB_DIR') or os.path.join(tempfile.gettempdir(), 'grocery_imports')
+    
+    # POS barcode lookups
+    BARCODE_CACHE_TTL = 60
+    BARCODE_CACHE_SIZE = 50000
+    
+    # Product search: auto, pg_trgm, fts5 or ngram
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'auto')
+    SEARCH_INDEX_TTL = 30
+    
+    # POS catalog sync: rows newer than the settle window are held back so a transaction
+    # that commits late with an older updated_at is not skipped by the cursor
+    CATALOG_SYNC_PAGE_SIZE = 500
+    CATALOG_SYNC_SETTLE_SECONDS = 2
+    CATALOG_CACHE_TTL = 300
+    
+    # Seconds a computed /api/dashboard/stats response is reused
+    DASHBOARD_STATS_TTL = 15
+    # Seconds other workers wait on a shared cache key another worker is computing
+    SHARED_CACHE_LEASE = 10
+    # Seconds a logged-in user row is reused by the login loader
+    USER_CACHE_TTL = 30
+    USER_CACHE_SIZE = 1000
+    
+    # Bearer tokens for POS terminals and scripts
+    API_TOKEN_TTL = int(os.environ.get('API_TOKEN_TTL', 3600))
+    API_TOKEN_REVOCATION_REFRESH = 5
+    
+    # Stock reservations slower than this are counted as lock waits
+    LOCK_WAIT_THRESHOLD_MS = 50
+    
+    # /api/invoices/batch: carts per request, and carts written per transaction
+    INVOICE_BATCH_MAX = 500
+    INVOICE_BATCH_GROUP_SIZE = 50
+    
+    # Idempotency-Key replay window for invoice creation (seconds)
+    IDEMPOTENCY_TTL = 24 * 60 * 60
+    IDEMPOTENCY_PURGE_INTERVAL = 10 * 60
+    
+    # Invoice numbers: 'block' reserves ranges per worker, 'gapless' numbers each day 1, 2, 3...
+    INVOICE_NUMBER_MODE = os.environ.get('INVOICE_NUMBER_MODE', 'block')
+    INVOICE_NUMBER_BLOCK_SIZE = 50
+    
+    # Activity log writer: 'async' batches rows on a background thread, 'sync' commits each one
+    AUDIT_LOG_MODE = os.environ.get('AUDIT_LOG_MODE', 'async')
+    AUDIT_BATCH_SIZE = 200
+    AUDIT_FLUSH_INTERVAL = 1.0
+    AUDIT_MAX_BUFFER = 10000
+    
+    # Activity log retention: whole months older than this are archived to gzip CSV files
+    ACTIVITY_LOG_RETENTION_MONTHS = 12
+    ACTIVITY_LOG_PARTITIONS_AHEAD = 3
+    ACTIVITY_LOG_ARCHIVE_DIR = os.environ.get('ACTIVITY_LOG_ARCHIVE_DIR') or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'archives'
+    )
+    
+    PDF_CACHE_DIR = os.environ.get('PDF_CACHE_DIR') or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'pdf_cache'
+    )
+    PDF_CACHE_MAX_BYTES = int(os.environ.get('PDF_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+    PDF_EXPORT_WORKERS = int(os.environ.get('PDF_EXPORT_WORKERS', 0))
+    PDF_EXPORT_MAX_INVOICES = 5000
+    RECEIPT_WIDTH = int(os.environ.get('RECEIPT_WIDTH', 48))
+    
     # Business logic
     TAX_RATE = 0.18
     LOW_STOCK_THRESHOLD = 10
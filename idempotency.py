@@ -0,0 +1,82 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import jsonify
+
+from config import Config
+from models import db, IdempotencyKey
+
+_purge_lock = threading.Lock()
+_last_purge = 0.0
+
+
+class IdempotencyConflict(Exception):
+    pass
+
+
+def find_response(key, user_id, endpoint):
+    record = db.session.get(IdempotencyKey, key)
+    if record is None:
+        return None
+    if record.expires_at < datetime.utcnow():
+        return None
+    if record.user_id != user_id or record.endpoint != endpoint:
+        raise IdempotencyConflict('Idempotency-Key was already used for a different request')
+    return json.loads(record.response), record.status_code
+
+
+def find_responses(keys, user_id, endpoint):
+    # Batch form of find_response in one query: {key: (payload, status_code), IdempotencyConflict,
+    # or None for an expired record that store_response may overwrite}
+    found = {}
+    if not keys:
+        return found
+    now = datetime.utcnow()
+    for record in IdempotencyKey.query.filter(IdempotencyKey.key.in_(keys)):
+        if record.expires_at < now:
+            found[record.key] = None
+        elif record.user_id != user_id or record.endpoint != endpoint:
+            found[record.key] = IdempotencyConflict('Idempotency-Key was already used for a different request')
+        else:
+            found[record.key] = (json.loads(record.response), record.status_code)
+    return found
+
+
+def replay(payload, status_code):
+    response = jsonify(payload)
+    response.status_code = status_code
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def store_response(key, user_id, endpoint, payload, status_code=200, new=False):
+    # Added to the caller's transaction so the key commits together with the work it protects;
+    # merge() so an expired record with the same key is overwritten. Callers that already know
+    # the key is unused pass new=True and skip merge()'s lookup.
+    now = datetime.utcnow()
+    record = IdempotencyKey(
+        key=key,
+        user_id=user_id,
+        endpoint=endpoint,
+        status_code=status_code,
+        response=json.dumps(payload),
+        created_at=now,
+        expires_at=now + timedelta(seconds=Config.IDEMPOTENCY_TTL)
+    )
+    if new:
+        db.session.add(record)
+    else:
+        db.session.merge(record)
+
+
+def purge_expired():
+    global _last_purge
+    with _purge_lock:
+        if time.monotonic() - _last_purge < Config.IDEMPOTENCY_PURGE_INTERVAL:
+            return 0
+        _last_purge = time.monotonic()
+    deleted = IdempotencyKey.query.filter(IdempotencyKey.expires_at < datetime.utcnow()).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
@@ -0,0 +1,90 @@
+import io
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from config import Config
+from models import db, ImportJob
+from audit import log_activity
+from importer import ProductImporter
+from cache import barcode_index
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=Config.IMPORT_WORKERS, thread_name_prefix='product-import')
+        return _executor
+
+
+def submit_import(app, file_storage, mode, user_id, ip_address=None):
+    os.makedirs(Config.IMPORT_JOB_DIR, exist_ok=True)
+    job_id = uuid.uuid4().hex
+    upload_path = os.path.join(Config.IMPORT_JOB_DIR, f'{job_id}.csv')
+    # Spool the upload to disk so the worker outlives the request
+    file_storage.save(upload_path)
+
+    job = ImportJob(
+        id=job_id,
+        user_id=user_id,
+        filename=file_storage.filename,
+        mode=mode,
+        bytes_total=os.path.getsize(upload_path)
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    get_executor().submit(run_import_job, app, job_id, upload_path, ip_address)
+    return job
+
+
+def record_progress(job, importer, raw):
+    job.rows_parsed = importer.parsed
+    job.rows_inserted = importer.inserted
+    job.rows_updated = importer.updated
+    job.rows_rejected = len(importer.rejected)
+    job.bytes_read = min(raw.tell(), job.bytes_total)
+
+
+def run_import_job(app, job_id, upload_path, ip_address=None):
+    with app.app_context():
+        job = db.session.get(ImportJob, job_id)
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        db.session.commit()
+
+        importer = ProductImporter(chunk_size=Config.IMPORT_CHUNK_SIZE, mode=job.mode)
+        try:
+            with open(upload_path, 'rb') as raw:
+                stream = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+                importer.run(stream, on_progress=lambda imp: record_progress(job, imp, raw))
+                job.bytes_read = job.bytes_total
+            job.status = 'completed'
+        except Exception as e:
+            # Chunks committed before the failure are kept, along with their progress counters
+            db.session.rollback()
+            job.status = 'failed'
+            job.error = str(e)
+
+        if importer.rejected:
+            rejects_path = os.path.join(Config.IMPORT_JOB_DIR, f'{job_id}-rejects.csv')
+            importer.write_rejects(rejects_path)
+            job.rejects_path = rejects_path
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        # Imports touch arbitrary barcodes, so drop the whole index
+        barcode_index.clear()
+
+        if os.path.exists(upload_path):
+            os.remove(upload_path)
+
+        log_activity(job.user_id, 'PRODUCT_IMPORT',
+            f'Import {job.status}: {job.rows_inserted} added, {job.rows_updated} updated, '
+            f'{job.rows_rejected} rejected ({job.mode}, {importer.rows_per_sec:,.0f} rows/sec)',
+            ip_address)
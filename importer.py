@@ -0,0 +1,198 @@
+import csv
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import bindparam
+
+from models import db, Product, Category, dialect_insert
+from valuation import apply_value_deltas, import_value_deltas
+
+IMPORT_MODES = ('insert', 'merge')
+# Columns a merge may overwrite; only those present in the CSV header are, so a price-only
+# feed leaves stock and cost alone
+MERGE_COLUMNS = ('price', 'cost_price', 'quantity')
+
+HEADER_ALIASES = {
+    'productname': 'name',
+    'product_name': 'name',
+    'product': 'name',
+    'costprice': 'cost_price',
+    'cost': 'cost_price',
+    'qty': 'quantity',
+    'stock': 'quantity',
+}
+
+
+def normalize_header(name):
+    key = (name or '').strip().lower().replace(' ', '_')
+    return HEADER_ALIASES.get(key, key)
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ProductImporter:
+    def __init__(self, chunk_size=1000, mode='insert'):
+        if mode not in IMPORT_MODES:
+            raise ValueError(f'Unknown import mode: {mode}')
+        self.chunk_size = chunk_size
+        self.mode = mode
+        self.categories = {}
+        self.barcodes = set()
+        self.stored = set()
+        self.merge_columns = MERGE_COLUMNS
+        self.parsed = 0
+        self.inserted = 0
+        self.updated = 0
+        self.rejected = []
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_sec(self):
+        return self.parsed / self.elapsed if self.elapsed else 0.0
+
+    def preload(self):
+        self.categories = dict(db.session.query(Category.name, Category.id).all())
+        self.barcodes = {barcode for (barcode,) in db.session.query(Product.barcode)}
+        self.stored = set(self.barcodes)
+
+    def run(self, stream, on_progress=None):
+        started = time.perf_counter()
+        self.preload()
+
+        reader = csv.DictReader(stream)
+        reader.fieldnames = [normalize_header(h) for h in (reader.fieldnames or [])]
+        self.merge_columns = tuple(column for column in MERGE_COLUMNS if column in reader.fieldnames)
+
+        # Each chunk is committed on its own so an interrupted import keeps its progress
+        prepared = (self.prepare_row(row, line_no) for line_no, row in enumerate(reader, start=2))
+        for chunk in chunked((values for values in prepared if values), self.chunk_size):
+            self.write_chunk(chunk)
+            self.elapsed = time.perf_counter() - started
+            if on_progress:
+                on_progress(self)
+            db.session.commit()
+
+        self.elapsed = time.perf_counter() - started
+        if on_progress:
+            on_progress(self)
+        db.session.commit()
+        return self
+
+    def write_rejects(self, path):
+        extra = []
+        for reject in self.rejected:
+            extra.extend(key for key in reject['row'] if key is not None and key not in extra)
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=['line', 'reason'] + extra, extrasaction='ignore')
+            writer.writeheader()
+            for reject in self.rejected:
+                writer.writerow({**reject['row'], 'line': reject['line'], 'reason': reject['reason']})
+
+    def reject(self, line_no, row, reason):
+        self.rejected.append({'line': line_no, 'reason': reason, 'row': row})
+
+    def prepare_row(self, row, line_no):
+        self.parsed += 1
+
+        name = (row.get('name') or '').strip()
+        if not name:
+            self.reject(line_no, row, 'Missing product name')
+            return None
+
+        try:
+            price = Decimal(row.get('price') or 0)
+            cost_price = Decimal(row.get('cost_price') or 0)
+            quantity = int(row.get('quantity') or 0)
+        except (InvalidOperation, ValueError):
+            self.reject(line_no, row, 'Invalid price, cost_price or quantity')
+            return None
+        if not (price.is_finite() and cost_price.is_finite()) or min(price, cost_price, quantity) < 0:
+            self.reject(line_no, row, 'Negative or non-finite price, cost_price or quantity')
+            return None
+
+        return {
+            'name': name,
+            'barcode': self.assign_barcode((row.get('barcode') or '').strip()),
+            'category_id': self.category_id((row.get('category') or '').strip()),
+            'price': price,
+            'cost_price': cost_price,
+            'quantity': quantity,
+            'unit': row.get('unit') or 'piece',
+            'description': row.get('description') or '',
+        }
+
+    def category_id(self, name):
+        if not name:
+            return None
+        if name not in self.categories:
+            result = db.session.execute(Category.__table__.insert().values(name=name))
+            self.categories[name] = result.inserted_primary_key[0]
+        return self.categories[name]
+
+    def assign_barcode(self, barcode):
+        # In merge mode a known barcode identifies the product to update
+        if barcode and self.mode == 'merge':
+            self.barcodes.add(barcode)
+            return barcode
+        while not barcode or barcode in self.barcodes:
+            barcode = Product.generate_barcode()
+        self.barcodes.add(barcode)
+        return barcode
+
+    def write_chunk(self, chunk):
+        if self.mode == 'merge':
+            self.merge_chunk(chunk)
+        else:
+            db.session.execute(Product.__table__.insert(), chunk)
+            apply_value_deltas(import_value_deltas(chunk))
+            self.inserted += len(chunk)
+        self.stored.update(values['barcode'] for values in chunk)
+
+    def merge_chunk(self, chunk):
+        # A single statement cannot touch the same row twice; the last row for a barcode wins
+        chunk = list({values['barcode']: values for values in chunk}.values())
+        now = datetime.utcnow()
+        for values in chunk:
+            values['updated_at'] = now
+        existing = sum(1 for values in chunk if values['barcode'] in self.stored)
+        deltas = import_value_deltas(chunk, merge_columns=self.merge_columns)
+
+        table = Product.__table__
+        stmt = dialect_insert(table)
+        if stmt is not None:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.barcode],
+                set_={column: stmt.excluded[column] for column in self.merge_columns + ('updated_at',)}
+            )
+            db.session.execute(stmt, chunk)
+        else:
+            self.merge_chunk_portable(chunk)
+        apply_value_deltas(deltas)
+
+        self.updated += existing
+        self.inserted += len(chunk) - existing
+
+    def merge_chunk_portable(self, chunk):
+        table = Product.__table__
+        updates = [values for values in chunk if values['barcode'] in self.stored]
+        inserts = [values for values in chunk if values['barcode'] not in self.stored]
+        if updates:
+            columns = self.merge_columns + ('updated_at',)
+            stmt = table.update().where(table.c.barcode == bindparam('b_barcode')).values(
+                {column: bindparam(f'b_{column}') for column in columns}
+            )
+            db.session.execute(stmt, [
+                {f'b_{key}': values[key] for key in ('barcode',) + columns} for values in updates
+            ])
+        if inserts:
+            db.session.execute(table.insert(), inserts)
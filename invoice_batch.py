@@ -0,0 +1,187 @@
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy.exc import IntegrityError
+
+from config import Config
+from models import db, Product, Customer, Invoice, InvoiceItem
+from checkout import CheckoutError, cart_quantities, price_cart, reserve_stock, credit_customer
+from idempotency import IdempotencyConflict, find_responses, find_response, store_response
+from rollups import record_daily_sales
+from serializers import invoice_load_options
+
+IDEMPOTENCY_ENDPOINT = 'invoice_create'
+
+
+class BatchEntry:
+    def __init__(self, index, data):
+        self.index = index
+        self.data = data if isinstance(data, dict) else {}
+        self.client_ref = self.data.get('client_ref')
+        self.key = None
+        self.key_is_new = True
+        self.customer_id = None
+        self.quantities = None
+        self.discount_percent = None
+        self.lines = None
+        self.totals = None
+        self.invoice = None
+        self.result = None
+
+    def finish(self, status, payload=None, error=None):
+        self.result = {'index': self.index, 'client_ref': self.client_ref, 'status': status}
+        if payload is not None:
+            self.result['invoice'] = payload['invoice']
+        if error is not None:
+            self.result['error'] = error
+
+
+def parse_entry(entry):
+    data = entry.data
+    if not data:
+        raise CheckoutError('Invoice must be a JSON object')
+    key = data.get('idempotency_key')
+    if key is not None and (not isinstance(key, str) or not key or len(key) > 100):
+        raise CheckoutError('Invalid idempotency_key')
+    entry.key = key
+    customer_id = data.get('customer_id')
+    try:
+        entry.customer_id = int(customer_id) if customer_id not in (None, '') else None
+        entry.discount_percent = Decimal(str(data.get('discount_percent', 0)))
+    except (TypeError, ValueError, InvalidOperation):
+        raise CheckoutError('Invalid customer_id or discount_percent')
+    entry.quantities = cart_quantities(data.get('items') or [])
+
+
+def submit_batch(carts, user_id):
+    # Validates, prices and writes many carts with one product query, one idempotency lookup and
+    # one aggregate stock UPDATE per group. Returns (entries, created entries, barcodes to invalidate).
+    entries = [BatchEntry(index, data) for index, data in enumerate(carts)]
+    pending = []
+    seen_keys = set()
+    for entry in entries:
+        try:
+            parse_entry(entry)
+        except CheckoutError as e:
+            entry.finish('error', error=str(e))
+            continue
+        if entry.key is not None:
+            if entry.key in seen_keys:
+                entry.finish('error', error='Duplicate idempotency_key in batch')
+                continue
+            seen_keys.add(entry.key)
+        pending.append(entry)
+
+    # Carts the till already sent (e.g. the response was lost) replay their first result
+    stored = find_responses([entry.key for entry in pending if entry.key], user_id, IDEMPOTENCY_ENDPOINT)
+    remaining = []
+    for entry in pending:
+        record = stored.get(entry.key) if entry.key else None
+        if isinstance(record, IdempotencyConflict):
+            entry.finish('error', error=str(record))
+        elif record is not None:
+            entry.finish('replayed', payload=record[0])
+        else:
+            entry.key_is_new = entry.key not in stored
+            remaining.append(entry)
+
+    product_ids = {product_id for entry in remaining for product_id in entry.quantities}
+    products = {p.id: p for p in Product.query.filter(Product.id.in_(product_ids))} if product_ids else {}
+    customer_ids = {entry.customer_id for entry in remaining if entry.customer_id}
+    # Loaded so invoice.to_dict() finds the customers in the identity map
+    customers = {c.id: c for c in Customer.query.filter(Customer.id.in_(customer_ids))} if customer_ids else {}
+    barcodes = {p.id: p.barcode for p in products.values()}
+
+    # Stock is allocated in submission order against one snapshot; a cart that no longer fits
+    # fails on its own instead of failing the batch
+    available = {p.id: p.quantity for p in products.values()}
+    accepted = []
+    for entry in remaining:
+        missing = [product_id for product_id in entry.quantities if product_id not in products]
+        if missing:
+            entry.finish('error', error=f'Product not found: {missing[0]}')
+            continue
+        if entry.customer_id and entry.customer_id not in customers:
+            entry.finish('error', error=f'Customer not found: {entry.customer_id}')
+            continue
+        short = [product_id for product_id, quantity in entry.quantities.items() if available[product_id] < quantity]
+        if short:
+            entry.finish('error', error=f'Insufficient stock for {products[short[0]].name}')
+            continue
+        for product_id, quantity in entry.quantities.items():
+            available[product_id] -= quantity
+        entry.lines, entry.totals = price_cart(entry.quantities, products, entry.discount_percent)
+        accepted.append(entry)
+
+    created = []
+    group_size = Config.INVOICE_BATCH_GROUP_SIZE
+    for start in range(0, len(accepted), group_size):
+        group = accepted[start:start + group_size]
+        try:
+            write_group(group, products, user_id)
+            created.extend(group)
+        except (CheckoutError, IntegrityError):
+            # Stock moved under us or a key raced another request: retry cart by cart so
+            # only the carts that really fail are reported as failed
+            db.session.rollback()
+            for entry in group:
+                try:
+                    write_group([entry], products, user_id)
+                    created.append(entry)
+                except CheckoutError as e:
+                    db.session.rollback()
+                    entry.finish('error', error=str(e))
+                except IntegrityError:
+                    db.session.rollback()
+                    record = find_response(entry.key, user_id, IDEMPOTENCY_ENDPOINT) if entry.key else None
+                    if record:
+                        entry.finish('replayed', payload=record[0])
+                    else:
+                        entry.finish('error', error='Invoice could not be saved')
+
+    touched = {product_id for entry in created for product_id in entry.quantities}
+    return entries, created, [barcodes[product_id] for product_id in touched]
+
+
+def write_group(group, products, user_id):
+    # One transaction for the whole group: invoice numbers, a single stock UPDATE for the
+    # summed demand, bulk invoice/item inserts, per-customer and per-day totals
+    numbers = [Invoice.generate_invoice_number() for _ in group]
+    demand = defaultdict(int)
+    for entry in group:
+        for product_id, quantity in entry.quantities.items():
+            demand[product_id] += quantity
+    reserve_stock(dict(demand), products)
+
+    # Core executemany for the rows, then one eager query for the ORM objects the response needs
+    db.session.execute(Invoice.__table__.insert(), [{
+        'invoice_number': number,
+        'customer_id': entry.customer_id,
+        'created_by': user_id,
+        'payment_method': entry.data.get('payment_method', 'cash'),
+        'notes': entry.data.get('notes', ''),
+        **entry.totals
+    } for entry, number in zip(group, numbers)])
+    ids = dict(db.session.query(Invoice.invoice_number, Invoice.id).filter(Invoice.invoice_number.in_(numbers)))
+    db.session.execute(InvoiceItem.__table__.insert(), [
+        {**line, 'invoice_id': ids[number]} for entry, number in zip(group, numbers) for line in entry.lines
+    ])
+    invoices = {invoice.id: invoice for invoice in Invoice.query.options(*invoice_load_options()).filter(Invoice.id.in_(ids.values()))}
+    for entry, number in zip(group, numbers):
+        entry.invoice = invoices[ids[number]]
+
+    credits = defaultdict(lambda: [Decimal('0'), 0])
+    for entry in group:
+        if entry.customer_id:
+            credits[entry.customer_id][0] += entry.totals['total_amount']
+            credits[entry.customer_id][1] += int(entry.totals['total_amount'] / 100)
+    for customer_id, (total_amount, points) in credits.items():
+        credit_customer(customer_id, total_amount, points)
+    record_daily_sales(list(invoices.values()))
+
+    for entry in group:
+        payload = {'success': True, 'invoice': entry.invoice.to_dict()}
+        if entry.key:
+            store_response(entry.key, user_id, IDEMPOTENCY_ENDPOINT, payload, new=entry.key_is_new)
+        entry.finish('created', payload=payload)
+    db.session.commit()
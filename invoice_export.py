@@ -0,0 +1,163 @@
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from types import SimpleNamespace
+
+from config import Config
+from models import db, Customer, Invoice, InvoiceItem
+from pdf_cache import pdf_cache
+from pdf_generator import render_invoice_pdf
+from reports import filter_created_between
+
+INVOICE_COLUMNS = (
+    'id', 'invoice_number', 'created_at', 'subtotal', 'tax_rate', 'tax_amount', 'discount_percent',
+    'discount_amount', 'total_amount', 'payment_method', 'payment_status', 'notes'
+)
+ITEM_COLUMNS = ('product_name', 'quantity', 'unit_price', 'total_price')
+
+_pool = None
+_pool_key = None
+_pool_lock = threading.Lock()
+
+
+def export_statement(date_from, date_to):
+    # Invoices, customers and line items in a single query, ordered so each invoice's rows are adjacent
+    invoices = Invoice.__table__
+    items = InvoiceItem.__table__
+    stmt = db.select(
+        *[invoices.c[name] for name in INVOICE_COLUMNS],
+        Customer.name.label('customer_name'),
+        Customer.mobile.label('customer_mobile'),
+        *[items.c[name].label(f'item_{name}') for name in ITEM_COLUMNS]
+    ).select_from(invoices).outerjoin(
+        Customer, invoices.c.customer_id == Customer.id
+    ).outerjoin(
+        items, items.c.invoice_id == invoices.c.id
+    )
+    stmt = filter_created_between(stmt, invoices.c.created_at, date_from, date_to)
+    return stmt.order_by(invoices.c.created_at, invoices.c.id, items.c.id)
+
+
+def count_invoices(date_from, date_to):
+    query = filter_created_between(db.session.query(db.func.count(Invoice.id)), Invoice.created_at, date_from, date_to)
+    return query.scalar()
+
+
+def invoice_snapshots(stmt, batch_size=1000):
+    # Plain objects shaped like Invoice for generate_invoice_pdf; unlike ORM instances they
+    # can be pickled to worker processes
+    current = None
+    for rows in db.session.execute(stmt.execution_options(yield_per=batch_size)).partitions():
+        for row in rows:
+            if current is None or current.id != row.id:
+                if current is not None:
+                    yield current
+                current = SimpleNamespace(**{name: getattr(row, name) for name in INVOICE_COLUMNS})
+                current.customer = SimpleNamespace(
+                    name=row.customer_name, mobile=row.customer_mobile
+                ) if row.customer_name is not None else None
+                current.items = []
+            if row.item_product_name is not None:
+                current.items.append(SimpleNamespace(**{name: getattr(row, f'item_{name}') for name in ITEM_COLUMNS}))
+    if current is not None:
+        yield current
+
+
+def get_render_pool(workers=None):
+    # One pool per process, created on first use. Workers are spawned rather than forked so they
+    # never inherit a lock held by another thread of the web worker (audit writer, import
+    # executor, connection pool).
+    global _pool, _pool_key
+    workers = workers or Config.PDF_EXPORT_WORKERS or os.cpu_count() or 1
+    with _pool_lock:
+        # A pool created before a fork belongs to the parent process
+        if _pool is None or _pool_key != (os.getpid(), workers):
+            if _pool is not None and _pool_key[0] == os.getpid():
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_key = (os.getpid(), workers)
+        return _pool, workers
+
+
+def discard_render_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def render_invoices(snapshots, workers=None):
+    # Yields (snapshot, pdf bytes) as they finish. Already cached PDFs are read from disk and
+    # the rest render in the process pool, with a bounded number in flight so memory stays flat.
+    pool, workers = get_render_pool(workers)
+    window = workers * 4
+    pending = {}
+    rendered = 0
+
+    def finished(futures):
+        nonlocal rendered
+        for future in futures:
+            snapshot = pending.pop(future)
+            pdf = future.result()
+            pdf_cache.put(snapshot, pdf, evict=False)
+            rendered += 1
+            yield snapshot, pdf
+
+    try:
+        for snapshot in snapshots:
+            cached = pdf_cache.read(snapshot)
+            if cached is not None:
+                yield snapshot, cached
+                continue
+            pending[pool.submit(render_invoice_pdf, snapshot)] = snapshot
+            if len(pending) >= window:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from finished(done)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            yield from finished(done)
+    except BrokenProcessPool:
+        # A worker died; the next export starts a fresh pool
+        discard_render_pool(pool)
+        raise
+    finally:
+        # The pool is shared, so an abandoned download only cancels its own queued renders
+        for future in pending:
+            future.cancel()
+        if rendered:
+            pdf_cache.evict()
+
+
+class _ZipStream:
+    # Write-only file object that hands zipfile output back to the caller in chunks
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_invoice_zip(date_from, date_to, workers=None):
+    stream = _ZipStream()
+    # PDFs are already compressed, so entries are stored as-is
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_STORED) as archive:
+        for snapshot, pdf in render_invoices(invoice_snapshots(export_statement(date_from, date_to)), workers):
+            info = zipfile.ZipInfo(f'{snapshot.invoice_number}.pdf', date_time=snapshot.created_at.timetuple()[:6])
+            archive.writestr(info, pdf)
+            data = stream.pop()
+            if data:
+                yield data
+    yield stream.pop()
@@ -0,0 +1,213 @@
+import csv
+import gzip
+import os
+import re
+from datetime import date, datetime
+
+from sqlalchemy import text
+
+from config import Config
+from models import db, ActivityLog
+
+TABLE = ActivityLog.__tablename__
+ARCHIVE_COLUMNS = ('id', 'user_id', 'action', 'details', 'ip_address', 'created_at')
+PARTITION_NAME = re.compile(rf'^{TABLE}_p(\d{{4}})(\d{{2}})$')
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_range(month):
+    return datetime(month.year, month.month, 1), datetime.combine(add_months(month, 1), datetime.min.time())
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y%m}'
+
+
+def is_postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def is_partitioned():
+    if not is_postgres():
+        return False
+    return db.session.execute(text(
+        "SELECT c.relkind = 'p' FROM pg_class c WHERE c.oid = to_regclass(:table)"
+    ), {'table': TABLE}).scalar() or False
+
+
+def list_partitions():
+    # {month: partition table name} for the monthly partitions of activity_logs
+    rows = db.session.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:table)"
+    ), {'table': TABLE})
+    partitions = {}
+    for (name,) in rows:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+
+def ensure_partitions(months_ahead=None, start=None):
+    if not is_partitioned():
+        return []
+    months_ahead = Config.ACTIVITY_LOG_PARTITIONS_AHEAD if months_ahead is None else months_ahead
+    existing = list_partitions()
+    month = start or month_start(datetime.utcnow())
+    last = add_months(month_start(datetime.utcnow()), months_ahead)
+    default = f'{TABLE}_default'
+    has_default = db.session.execute(text('SELECT to_regclass(:table) IS NOT NULL'), {'table': default}).scalar()
+    db.session.commit()
+    columns = ', '.join(ARCHIVE_COLUMNS)
+    created = []
+    detached = False
+    with db.engine.begin() as conn:
+        while month <= last:
+            if month not in existing:
+                start_at, end_at = month_range(month)
+                bounds = {'start': start_at, 'end': end_at}
+                # Rows that landed in the default partition while the month had none would violate
+                # the new partition's bounds, so the default is detached while they are moved over
+                stranded = has_default and conn.execute(text(
+                    f'SELECT EXISTS (SELECT 1 FROM {default} WHERE created_at >= :start AND created_at < :end)'
+                ), bounds).scalar()
+                if stranded and not detached:
+                    conn.execute(text(f'ALTER TABLE {TABLE} DETACH PARTITION {default}'))
+                    detached = True
+                conn.execute(text(
+                    f'CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {TABLE} '
+                    f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+                ))
+                if stranded:
+                    conn.execute(text(
+                        f'INSERT INTO {TABLE} ({columns}) SELECT {columns} FROM {default} '
+                        'WHERE created_at >= :start AND created_at < :end'
+                    ), bounds)
+                    conn.execute(text(f'DELETE FROM {default} WHERE created_at >= :start AND created_at < :end'), bounds)
+                created.append(partition_name(month))
+            month = add_months(month, 1)
+        if detached:
+            conn.execute(text(f'ALTER TABLE {TABLE} ATTACH PARTITION {default} DEFAULT'))
+    return created
+
+
+def convert_to_partitioned():
+    # One-off migration: rebuild activity_logs as a table partitioned by month on created_at.
+    # The primary key has to include the partition key, so it becomes (id, created_at).
+    if not is_postgres():
+        raise RuntimeError('Native partitioning needs PostgreSQL')
+    if is_partitioned():
+        return 0
+
+    oldest = db.session.query(db.func.min(ActivityLog.created_at)).scalar()
+    db.session.commit()
+    first = month_start(oldest or datetime.utcnow())
+    legacy = f'{TABLE}_legacy'
+    with db.engine.begin() as conn:
+        conn.execute(text(f'ALTER TABLE {TABLE} RENAME TO {legacy}'))
+        conn.execute(text(f'ALTER TABLE {legacy} RENAME CONSTRAINT {TABLE}_pkey TO {legacy}_pkey'))
+        conn.execute(text(
+            f"CREATE TABLE {TABLE} ("
+            f"id INTEGER NOT NULL DEFAULT nextval('{TABLE}_id_seq'), "
+            "user_id INTEGER REFERENCES users (id), "
+            "action VARCHAR(100) NOT NULL, "
+            "details TEXT, "
+            "ip_address VARCHAR(50), "
+            "created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc'), "
+            f"PRIMARY KEY (id, created_at)"
+            f") PARTITION BY RANGE (created_at)"
+        ))
+        conn.execute(text(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT'))
+        month = first
+        last = add_months(month_start(datetime.utcnow()), Config.ACTIVITY_LOG_PARTITIONS_AHEAD)
+        while month <= last:
+            conn.execute(text(
+                f'CREATE TABLE {partition_name(month)} PARTITION OF {TABLE} '
+                f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+            ))
+            month = add_months(month, 1)
+        moved = conn.execute(text(
+            f'INSERT INTO {TABLE} (id, user_id, action, details, ip_address, created_at) '
+            f"SELECT id, user_id, action, details, ip_address, coalesce(created_at, now() AT TIME ZONE 'utc') FROM {legacy}"
+        )).rowcount
+        # Hand the id sequence to the new table before the old one (its owner) is dropped
+        conn.execute(text(f'ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id'))
+        conn.execute(text(f'DROP TABLE {legacy}'))
+    return moved
+
+
+def archive_path(month):
+    os.makedirs(Config.ACTIVITY_LOG_ARCHIVE_DIR, exist_ok=True)
+    base = os.path.join(Config.ACTIVITY_LOG_ARCHIVE_DIR, f'{TABLE}_{month:%Y_%m}')
+    path, suffix = f'{base}.csv.gz', 1
+    # Late rows for an already archived month go to a second file rather than overwrite the first
+    while os.path.exists(path):
+        path, suffix = f'{base}.{suffix}.csv.gz', suffix + 1
+    return path
+
+
+def export_month(month, path):
+    table = ActivityLog.__table__
+    start, end = month_range(month)
+    stmt = db.select(*[table.c[name] for name in ARCHIVE_COLUMNS]).where(
+        table.c.created_at >= start, table.c.created_at < end
+    ).order_by(table.c.created_at, table.c.id)
+    count = 0
+    with gzip.open(path, 'wt', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(ARCHIVE_COLUMNS)
+        for rows in db.session.execute(stmt.execution_options(yield_per=5000)).partitions():
+            writer.writerows(rows)
+            count += len(rows)
+    return count
+
+
+def archive_months(keep_months=None, dry_run=False):
+    # Moves whole months older than the retention window into gzip CSV files, then drops the
+    # month's partition on PostgreSQL or deletes the month's index range elsewhere
+    keep_months = Config.ACTIVITY_LOG_RETENTION_MONTHS if keep_months is None else keep_months
+    cutoff = add_months(month_start(datetime.utcnow()), -keep_months)
+    oldest = db.session.query(db.func.min(ActivityLog.created_at)).scalar()
+    partitioned = is_partitioned()
+    partitions = list_partitions() if partitioned else {}
+
+    results = []
+    starts = [month_start(oldest)] if oldest else []
+    starts.extend(partitions)
+    month = min(starts) if starts else cutoff
+    while month < cutoff:
+        start, end = month_range(month)
+        rows = db.session.query(db.func.count(ActivityLog.id)).filter(
+            ActivityLog.created_at >= start, ActivityLog.created_at < end
+        ).scalar()
+        result = {'month': f'{month:%Y-%m}', 'rows': rows, 'path': None}
+        if rows and not dry_run:
+            result['path'] = archive_path(month)
+            export_month(month, result['path'])
+        # End the read transaction so its locks do not block the DETACH below
+        db.session.commit()
+
+        if not dry_run and month in partitions:
+            with db.engine.begin() as conn:
+                conn.execute(text(f'ALTER TABLE {TABLE} DETACH PARTITION {partitions[month]}'))
+                conn.execute(text(f'DROP TABLE {partitions[month]}'))
+        elif rows and not dry_run:
+            db.session.query(ActivityLog).filter(
+                ActivityLog.created_at >= start, ActivityLog.created_at < end
+            ).delete(synchronize_session=False)
+            db.session.commit()
+
+        if rows or month in partitions:
+            results.append(result)
+        month = add_months(month, 1)
+    return results
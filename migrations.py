@@ -0,0 +1,66 @@
+from models import db, SchemaVersion
+
+INDEX_SET = 'hot_query_indexes'
+
+# Each version lists the indexes it adds. They are also declared on the models, so a fresh
+# database gets them from create_all; this brings existing databases up to date.
+INDEX_VERSIONS = {
+    1: (
+        'ix_invoices_created_at',
+        'ix_invoices_customer_id',
+        'ix_invoice_items_invoice_id',
+        'ix_invoice_items_product_id',
+        'ix_products_is_active_quantity',
+        'ix_activity_logs_created_at',
+    ),
+    # Keyset pagination orders products and customers by (name, id)
+    2: (
+        'ix_products_name',
+        'ix_customers_name',
+    ),
+    # POS catalog sync reads products in (updated_at, id) order
+    3: (
+        'ix_products_updated_at_id',
+    ),
+    # Activity log filters by user or action within a date range
+    4: (
+        'ix_activity_logs_user_id_created_at',
+        'ix_activity_logs_action_created_at',
+    ),
+}
+
+INDEX_SET_VERSION = max(INDEX_VERSIONS)
+
+
+def declared_indexes():
+    return {index.name: index for table in db.metadata.tables.values() for index in table.indexes}
+
+
+def applied_index_version():
+    row = db.session.get(SchemaVersion, INDEX_SET)
+    return row.version if row else 0
+
+
+def apply_index_set(force=False):
+    # force re-checks every version, e.g. after an index was dropped by hand
+    applied = 0 if force else applied_index_version()
+    if applied >= INDEX_SET_VERSION:
+        return []
+
+    indexes = declared_indexes()
+    created = []
+    with db.engine.begin() as conn:
+        inspector = db.inspect(conn)
+        for version in sorted(INDEX_VERSIONS):
+            if version <= applied:
+                continue
+            for name in INDEX_VERSIONS[version]:
+                if not inspector.has_index(indexes[name].table.name, name):
+                    indexes[name].create(conn)
+                    created.append(name)
+
+    row = db.session.get(SchemaVersion, INDEX_SET) or SchemaVersion(name=INDEX_SET)
+    row.version = INDEX_SET_VERSION
+    db.session.add(row)
+    db.session.commit()
+    return created
@@ -1,9 +1,16 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+import os
 import random
 import string
+import threading
+
+from config import Config
 
 db = SQLAlchemy()
 
@@ -61,9 +68,13 @@ class Category(db.Model):
 
 class Product(db.Model):
     __tablename__ = 'products'
+    __table_args__ = (
+        db.Index('ix_products_is_active_quantity', 'is_active', 'quantity'),
+        db.Index('ix_products_updated_at_id', 'updated_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(200), nullable=False)
+    name = db.Column(db.String(200), nullable=False, index=True)
     barcode = db.Column(db.String(50), unique=True, nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('categories.id'))
     price = db.Column(db.Numeric(10, 2), nullable=False)
@@ -100,14 +111,15 @@ class Product(db.Model):
             'description': self.description,
             'is_active': self.is_active,
             'is_low_stock': self.is_low_stock(),
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
 class Customer(db.Model):
     __tablename__ = 'customers'
     
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
+    name = db.Column(db.String(100), nullable=False, index=True)
     mobile = db.Column(db.String(20), unique=True, nullable=False)
     email = db.Column(db.String(120))
     address = db.Column(db.Text)
@@ -118,7 +130,10 @@ class Customer(db.Model):
     
     invoices = db.relationship('Invoice', backref='customer', lazy='dynamic')
     
-    def to_dict(self):
+    def to_dict(self, invoice_count=None):
+        # List endpoints pass invoice_count from one aggregate query; see serializers.py
+        if invoice_count is None:
+            invoice_count = self.invoices.count()
         return {
             'id': self.id,
             'name': self.name,
@@ -128,7 +143,7 @@ class Customer(db.Model):
             'loyalty_points': self.loyalty_points,
             'total_purchases': float(self.total_purchases) if self.total_purchases else 0,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'invoice_count': self.invoices.count()
+            'invoice_count': invoice_count
         }
 
 class Invoice(db.Model):
@@ -136,7 +151,7 @@ class Invoice(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     invoice_number = db.Column(db.String(50), unique=True, nullable=False)
-    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'))
+    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), index=True)
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     subtotal = db.Column(db.Numeric(12, 2), nullable=False)
     tax_amount = db.Column(db.Numeric(10, 2), default=0)
@@ -147,15 +162,17 @@ class Invoice(db.Model):
     payment_method = db.Column(db.String(50), default='cash')
     payment_status = db.Column(db.String(20), default='paid')
     notes = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
-    items = db.relationship('InvoiceItem', backref='invoice', lazy='dynamic', cascade='all, delete-orphan')
+    items = db.relationship('InvoiceItem', backref='invoice', lazy='select', cascade='all, delete-orphan')
     
     @staticmethod
     def generate_invoice_number():
+        # Widths differ from the legacy 6-digit random suffix so old and new numbers never collide
         date_part = datetime.now().strftime('%Y%m%d')
-        random_part = ''.join(random.choices(string.digits, k=6))
-        return f"INV-{date_part}-{random_part}"
+        if Config.INVOICE_NUMBER_MODE == 'gapless':
+            return f"INV-{date_part}-{next_gapless_value(f'invoice-{date_part}'):05d}"
+        return f"INV-{date_part}-{invoice_number_allocator.next_value():08d}"
     
     def to_dict(self):
         return {
@@ -183,8 +200,8 @@ class InvoiceItem(db.Model):
     __tablename__ = 'invoice_items'
     
     id = db.Column(db.Integer, primary_key=True)
-    invoice_id = db.Column(db.Integer, db.ForeignKey('invoices.id'), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    invoice_id = db.Column(db.Integer, db.ForeignKey('invoices.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False, index=True)
     product_name = db.Column(db.String(200), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     unit_price = db.Column(db.Numeric(10, 2), nullable=False)
@@ -203,13 +220,17 @@ class InvoiceItem(db.Model):
 
 class ActivityLog(db.Model):
     __tablename__ = 'activity_logs'
+    __table_args__ = (
+        db.Index('ix_activity_logs_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_activity_logs_action_created_at', 'action', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     action = db.Column(db.String(100), nullable=False)
     details = db.Column(db.Text)
     ip_address = db.Column(db.String(50))
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     def to_dict(self):
         return {
@@ -222,6 +243,171 @@ class ActivityLog(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+class ImportJob(db.Model):
+    __tablename__ = 'import_jobs'
+    
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    filename = db.Column(db.String(255))
+    mode = db.Column(db.String(20), default='insert')
+    status = db.Column(db.String(20), default='queued')
+    rows_parsed = db.Column(db.Integer, default=0)
+    rows_inserted = db.Column(db.Integer, default=0)
+    rows_updated = db.Column(db.Integer, default=0)
+    rows_rejected = db.Column(db.Integer, default=0)
+    bytes_total = db.Column(db.BigInteger, default=0)
+    bytes_read = db.Column(db.BigInteger, default=0)
+    rejects_path = db.Column(db.String(500))
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    user = db.relationship('User')
+    
+    def eta_seconds(self):
+        if self.status != 'running' or not self.started_at or not self.bytes_read:
+            return None
+        elapsed = (datetime.utcnow() - self.started_at).total_seconds()
+        return elapsed * (self.bytes_total - self.bytes_read) / self.bytes_read
+    
+    def to_dict(self):
+        eta = self.eta_seconds()
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'mode': self.mode,
+            'status': self.status,
+            'rows_parsed': self.rows_parsed or 0,
+            'rows_inserted': self.rows_inserted or 0,
+            'rows_updated': self.rows_updated or 0,
+            'rows_rejected': self.rows_rejected or 0,
+            'progress': round(100.0 * self.bytes_read / self.bytes_total, 1) if self.bytes_total else 0,
+            'eta_seconds': round(eta, 1) if eta is not None else None,
+            'has_rejects': bool(self.rejects_path),
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+    
+    key = db.Column(db.String(100), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    endpoint = db.Column(db.String(100), nullable=False)
+    status_code = db.Column(db.Integer, default=200)
+    response = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class DailySales(db.Model):
+    __tablename__ = 'daily_sales'
+    
+    day = db.Column(db.Date, primary_key=True)
+    invoice_count = db.Column(db.Integer, nullable=False, default=0)
+    subtotal = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    tax_amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    discount_amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    total_amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
+class SharedCacheEntry(db.Model):
+    __tablename__ = 'shared_cache'
+    
+    key = db.Column(db.String(200), primary_key=True)
+    # JSON value, or NULL while the worker that claimed the key is still computing it
+    value = db.Column(db.Text)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class InventoryValue(db.Model):
+    __tablename__ = 'inventory_values'
+    
+    # Category id, or 0 for products without a category
+    category_key = db.Column(db.Integer, primary_key=True)
+    stock_value = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    cost_value = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+
+class NumberSequence(db.Model):
+    __tablename__ = 'number_sequences'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    next_value = db.Column(db.BigInteger, nullable=False, default=1)
+
+class BlockAllocator:
+    def __init__(self, name, block_size):
+        self.name = name
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._pid = None
+        self._next = 0
+        self._end = 0
+    
+    def reserve_block(self):
+        # Runs in its own committed transaction so a block is never handed out twice,
+        # even if the invoice that triggered it rolls back
+        table = NumberSequence.__table__
+        stmt = dialect_insert(table)
+        with db.engine.begin() as conn:
+            if stmt is not None:
+                conn.execute(stmt.values(name=self.name, next_value=1 + self.block_size).on_conflict_do_update(
+                    index_elements=[table.c.name],
+                    set_={'next_value': table.c.next_value + self.block_size}
+                ))
+            elif not conn.execute(
+                table.update().where(table.c.name == self.name).values(next_value=table.c.next_value + self.block_size)
+            ).rowcount:
+                conn.execute(table.insert().values(name=self.name, next_value=1 + self.block_size))
+            end = conn.execute(db.select(table.c.next_value).where(table.c.name == self.name)).scalar()
+        return end - self.block_size, end
+    
+    def next_value(self):
+        with self._lock:
+            # A block reserved before a fork must not be shared with the child process
+            if self._next >= self._end or self._pid != os.getpid():
+                self._next, self._end = self.reserve_block()
+                self._pid = os.getpid()
+            value = self._next
+            self._next += 1
+            return value
+
+invoice_number_allocator = BlockAllocator('invoice', Config.INVOICE_NUMBER_BLOCK_SIZE)
+
+def next_gapless_value(name):
+    # Increments inside the caller's transaction: the row lock serializes writers and a
+    # rollback returns the number, so there are no gaps
+    table = NumberSequence.__table__
+    stmt = dialect_insert(table)
+    if stmt is not None:
+        db.session.execute(stmt.values(name=name, next_value=2).on_conflict_do_update(
+            index_elements=[table.c.name],
+            set_={'next_value': table.c.next_value + 1}
+        ))
+    elif not db.session.execute(
+        table.update().where(table.c.name == name).values(next_value=table.c.next_value + 1)
+    ).rowcount:
+        db.session.execute(table.insert().values(name=name, next_value=2))
+    return db.session.execute(db.select(table.c.next_value).where(table.c.name == name)).scalar() - 1
+
+class SchemaVersion(db.Model):
+    __tablename__ = 'schema_versions'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class RevokedToken(db.Model):
+    __tablename__ = 'revoked_tokens'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    # A row with a jti revokes one token; a row without one revokes every token the user
+    # was issued before revoked_at
+    jti = db.Column(db.String(32), unique=True)
+    # No foreign key: deleting a user has to leave its revocation behind
+    user_id = db.Column(db.Integer)
+    revoked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
 def log_activity(user_id, action, details=None, ip_address=None):
     log = ActivityLog(
         user_id=user_id,
@@ -231,3 +417,31 @@ def log_activity(user_id, action, details=None, ip_address=None):
     )
     db.session.add(log)
     db.session.commit()
+
+
+def dialect_insert(table, bind=None):
+    # INSERT with ON CONFLICT support for the active backend, None if unsupported
+    dialect = (bind or db.session.get_bind()).dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(table)
+    if dialect == 'sqlite':
+        return sqlite.insert(table)
+    return None
+
+
+def on_commit(session, callback):
+    # Runs callback once the session's transaction commits and drops it on rollback, for
+    # in-memory state that must not get ahead of the database
+    if session is None:
+        callback()
+    else:
+        session.info.setdefault('on_commit', []).append(callback)
+
+
+def _run_on_commit(session):
+    for callback in session.info.pop('on_commit', []):
+        callback()
+
+
+event.listen(Session, 'after_commit', _run_on_commit)
+event.listen(Session, 'after_rollback', lambda session: session.info.pop('on_commit', None))
@@ -0,0 +1,123 @@
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import DateTime, Numeric, text
+
+from models import db
+
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 200
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor=None, prev_cursor=None, total=None, total_is_estimate=False):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+        self.total_is_estimate = total_is_estimate
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def meta(self):
+        return {
+            'next_cursor': self.next_cursor,
+            'prev_cursor': self.prev_cursor,
+            'has_next': self.has_next,
+            'has_prev': self.has_prev,
+            'total': self.total,
+            'total_is_estimate': self.total_is_estimate
+        }
+
+
+def encode_cursor(values, backwards=False):
+    values = [v.isoformat() if isinstance(v, datetime) else str(v) if isinstance(v, Decimal) else v for v in values]
+    raw = json.dumps({'k': values, 'b': int(backwards)}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, columns):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        values = data['k']
+        if len(values) != len(columns):
+            raise InvalidCursor('Cursor does not match this listing')
+        decoded = []
+        for column, value in zip(columns, values):
+            if isinstance(column.type, DateTime):
+                value = datetime.fromisoformat(value)
+            elif isinstance(column.type, Numeric):
+                value = Decimal(value)
+            decoded.append(value)
+        return decoded, bool(data.get('b'))
+    except InvalidCursor:
+        raise
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise InvalidCursor('Malformed cursor')
+
+
+def keyset_paginate(query, columns, descending=False, cursor=None, per_page=DEFAULT_PER_PAGE):
+    # Seeks past the last seen key instead of using OFFSET, so page 1000 costs the same as page 1.
+    # The last column must be unique (the primary key) to break ties.
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    values, backwards = decode_cursor(cursor, columns) if cursor else (None, False)
+
+    # Walking backwards reverses the scan and flips the rows afterwards
+    scan_descending = descending != backwards
+    if values is not None:
+        key = db.tuple_(*columns)
+        bound = db.tuple_(*[db.literal(value, column.type) for column, value in zip(columns, values)])
+        query = query.filter(key < bound if scan_descending else key > bound)
+    query = query.order_by(*[column.desc() if scan_descending else column.asc() for column in columns])
+
+    rows = query.limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    page = KeysetPage(rows)
+    if rows:
+        first = [getattr(rows[0], column.key) for column in columns]
+        last = [getattr(rows[-1], column.key) for column in columns]
+        if more if not backwards else values is not None:
+            page.next_cursor = encode_cursor(last)
+        if more if backwards else values is not None:
+            page.prev_cursor = encode_cursor(first, backwards=True)
+    return page
+
+
+def estimated_count(model):
+    # Planner statistics on PostgreSQL, the largest rowid on SQLite; both avoid a full COUNT(*)
+    table = model.__tablename__
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        estimate = db.session.execute(
+            text('SELECT reltuples::bigint FROM pg_class WHERE relname = :table'), {'table': table}
+        ).scalar()
+        if estimate is not None and estimate >= 0:
+            return estimate
+    elif dialect == 'sqlite':
+        return db.session.execute(text(f'SELECT max(rowid) FROM {table}')).scalar() or 0
+    return db.session.query(db.func.count()).select_from(model).scalar()
+
+
+def page_total(query, model, mode, filtered):
+    # mode is 'exact', 'approx' or anything else for no total
+    if mode == 'exact':
+        return query.order_by(None).count(), False
+    if mode == 'approx' and not filtered:
+        return estimated_count(model), True
+    return None, False
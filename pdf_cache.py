@@ -0,0 +1,180 @@
+import hashlib
+import os
+import tempfile
+import threading
+
+from config import Config
+from pdf_generator import TEMPLATE_VERSION
+
+
+class PDFCache:
+    # Rendered invoices on disk, evicted least recently used first once the directory passes
+    # max_bytes. Invoices never change after checkout, so a file is valid for as long as the
+    # template version it was rendered with.
+    
+    # Eviction trims the directory to this share of max_bytes, so the next scan is far off
+    LOW_WATER = 0.9
+    
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._inflight = {}
+        # Directory size at the last scan plus what this process has written since; None
+        # until the first scan. Other workers write here too, hence the periodic rescan.
+        self._bytes = None
+        self._written = 0
+
+    def key(self, invoice):
+        # The invoice number and timestamp keep a rebuilt database that reuses ids from
+        # picking up another invoice's PDF
+        raw = f'{invoice.id}|{invoice.invoice_number}|{invoice.created_at.isoformat()}|{TEMPLATE_VERSION}'
+        return f'{invoice.id}-{hashlib.sha256(raw.encode()).hexdigest()[:16]}'
+
+    def path_for(self, key):
+        return os.path.join(self.directory, f'{key}.pdf')
+
+    def get_or_render(self, invoice, render):
+        # Returns (path, hit); render() returns a file-like object holding the PDF
+        key = self.key(invoice)
+        path = self.path_for(key)
+        if self._touch(path):
+            self._count(hit=True)
+            return path, True
+
+        with self._lock:
+            key_lock = self._inflight.setdefault(key, threading.Lock())
+        with key_lock:
+            try:
+                if self._touch(path):
+                    self._count(hit=True)
+                    return path, True
+                self._store(path, render().getvalue())
+            finally:
+                with self._lock:
+                    if self._inflight.get(key) is key_lock:
+                        del self._inflight[key]
+        self._count(hit=False)
+        self.evict(keep=path)
+        return path, False
+
+    def read(self, invoice):
+        path = self.path_for(self.key(invoice))
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            self._count(hit=False)
+            return None
+        self._touch(path)
+        self._count(hit=True)
+        return data
+
+    def put(self, invoice, data, evict=True):
+        path = self.path_for(self.key(invoice))
+        self._store(path, data)
+        if evict:
+            self.evict(keep=path)
+        return path
+
+    def _store(self, path, data):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            # Readers in other workers only ever see a complete file
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes += len(data)
+            self._written += len(data)
+
+    def _touch(self, path):
+        # The file's mtime doubles as its last-used time for LRU eviction
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _entries(self):
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith('.pdf'):
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def evict(self, keep=None):
+        with self._lock:
+            if self._bytes is not None and self._bytes <= self.max_bytes and self._written < self.max_bytes // 10:
+                return 0
+            self._written = 0
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * self.LOW_WATER if total > self.max_bytes else total
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        with self._lock:
+            self._bytes = total
+            self.evictions += removed
+        return removed
+
+    def clear(self):
+        removed = 0
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._bytes = None
+        return removed
+
+    def stats(self):
+        entries = self._entries()
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'files': len(entries),
+                'bytes': sum(size for _, size, _ in entries),
+                'max_bytes': self.max_bytes
+            }
+
+
+pdf_cache = PDFCache(Config.PDF_CACHE_DIR, Config.PDF_CACHE_MAX_BYTES)
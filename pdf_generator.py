@@ -3,14 +3,19 @@ from reportlab.lib.units import mm
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
+from reportlab.lib.enums import TA_CENTER, TA_LEFT
 from io import BytesIO
+import copy
+import threading
 from datetime import datetime
 
-def generate_invoice_pdf(invoice):
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=20*mm, leftMargin=20*mm, topMargin=20*mm, bottomMargin=20*mm)
-    
+# Bump when the layout changes so cached PDFs rendered with the old layout are not served
+TEMPLATE_VERSION = 1
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def _build_shared():
     styles = getSampleStyleSheet()
     
     title_style = ParagraphStyle(
@@ -29,35 +34,75 @@ def generate_invoice_pdf(invoice):
         spaceAfter=5*mm
     )
     
-    heading_style = ParagraphStyle(
-        'Heading',
-        parent=styles['Heading2'],
-        fontSize=12,
-        spaceAfter=3*mm
-    )
-    
-    normal_style = ParagraphStyle(
-        'Normal',
-        parent=styles['Normal'],
-        fontSize=10
-    )
-    
-    right_style = ParagraphStyle(
-        'Right',
-        parent=styles['Normal'],
-        fontSize=10,
-        alignment=TA_RIGHT
-    )
-    
-    elements = []
-    
-    elements.append(Paragraph("GROCERY STORE", title_style))
-    elements.append(Paragraph("Your Trusted Shopping Partner", subtitle_style))
-    elements.append(Paragraph("123 Main Street, Karachi, Pakistan | Phone: +92 21 1234567", subtitle_style))
-    elements.append(Spacer(1, 5*mm))
+    return {
+        'header': [
+            Paragraph("GROCERY STORE", title_style),
+            Paragraph("Your Trusted Shopping Partner", subtitle_style),
+            Paragraph("123 Main Street, Karachi, Pakistan | Phone: +92 21 1234567", subtitle_style),
+            Spacer(1, 5*mm),
+            Paragraph("TAX INVOICE", ParagraphStyle('InvTitle', parent=styles['Heading2'], fontSize=16, alignment=TA_CENTER, textColor=colors.HexColor('#2563eb'))),
+            Spacer(1, 5*mm),
+        ],
+        'footer': [
+            Paragraph("Thank you for shopping with us!", ParagraphStyle('Thanks', parent=styles['Normal'], fontSize=12, alignment=TA_CENTER, textColor=colors.HexColor('#2563eb'))),
+            Spacer(1, 3*mm),
+            Paragraph("Please retain this invoice for your records.", ParagraphStyle('Footer', parent=styles['Normal'], fontSize=9, alignment=TA_CENTER, textColor=colors.grey)),
+        ],
+        'info_style': TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 3*mm),
+        ]),
+        'items_style': TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2563eb')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            ('ALIGN', (2, 1), (-1, -1), 'RIGHT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8fafc')]),
+            ('TOPPADDING', (0, 0), (-1, -1), 3*mm),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 3*mm),
+        ]),
+        'totals_style': TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('ALIGN', (3, 0), (-1, -1), 'RIGHT'),
+            ('FONTNAME', (3, -1), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (3, -1), (-1, -1), 12),
+            ('LINEABOVE', (3, -1), (-1, -1), 1, colors.black),
+            ('TOPPADDING', (0, 0), (-1, -1), 2*mm),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 2*mm),
+        ]),
+        'payment_style': TableStyle([
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('TOPPADDING', (0, 0), (-1, -1), 2*mm),
+        ]),
+    }
+
+def _get_shared():
+    # Styles and the static header/footer are parsed once per process; layout state is
+    # kept on the flowable, so each build gets shallow copies of the shared paragraphs
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = _build_shared()
+    return _shared
+
+def generate_invoice_pdf(invoice):
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=20*mm, leftMargin=20*mm, topMargin=20*mm, bottomMargin=20*mm)
     
-    elements.append(Paragraph("TAX INVOICE", ParagraphStyle('InvTitle', parent=styles['Heading2'], fontSize=16, alignment=TA_CENTER, textColor=colors.HexColor('#2563eb'))))
-    elements.append(Spacer(1, 5*mm))
+    shared = _get_shared()
+    elements = [copy.copy(flowable) for flowable in shared['header']]
     
     invoice_info = [
         ['Invoice Number:', invoice.invoice_number, 'Date:', invoice.created_at.strftime('%d/%m/%Y %H:%M')],
@@ -65,14 +110,7 @@ def generate_invoice_pdf(invoice):
     ]
     
     info_table = Table(invoice_info, colWidths=[30*mm, 55*mm, 25*mm, 55*mm])
-    info_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 3*mm),
-    ]))
+    info_table.setStyle(shared['info_style'])
     elements.append(info_table)
     elements.append(Spacer(1, 8*mm))
     
@@ -87,19 +125,7 @@ def generate_invoice_pdf(invoice):
         ])
     
     items_table = Table(items_data, colWidths=[10*mm, 85*mm, 20*mm, 30*mm, 30*mm])
-    items_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2563eb')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-        ('ALIGN', (2, 1), (-1, -1), 'RIGHT'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8fafc')]),
-        ('TOPPADDING', (0, 0), (-1, -1), 3*mm),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 3*mm),
-    ]))
+    items_table.setStyle(shared['items_style'])
     elements.append(items_table)
     elements.append(Spacer(1, 5*mm))
     
@@ -114,16 +140,7 @@ def generate_invoice_pdf(invoice):
     totals_data.append(['', '', '', 'TOTAL:', f"Rs. {float(invoice.total_amount):,.2f}"])
     
     totals_table = Table(totals_data, colWidths=[10*mm, 85*mm, 20*mm, 30*mm, 30*mm])
-    totals_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('ALIGN', (3, 0), (-1, -1), 'RIGHT'),
-        ('FONTNAME', (3, -1), (-1, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (3, -1), (-1, -1), 12),
-        ('LINEABOVE', (3, -1), (-1, -1), 1, colors.black),
-        ('TOPPADDING', (0, 0), (-1, -1), 2*mm),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 2*mm),
-    ]))
+    totals_table.setStyle(shared['totals_style'])
     elements.append(totals_table)
     elements.append(Spacer(1, 8*mm))
     
@@ -136,19 +153,16 @@ def generate_invoice_pdf(invoice):
         payment_info.append(['Notes:', invoice.notes])
     
     payment_table = Table(payment_info, colWidths=[35*mm, 130*mm])
-    payment_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('TOPPADDING', (0, 0), (-1, -1), 2*mm),
-    ]))
+    payment_table.setStyle(shared['payment_style'])
     elements.append(payment_table)
     elements.append(Spacer(1, 10*mm))
     
-    elements.append(Paragraph("Thank you for shopping with us!", ParagraphStyle('Thanks', parent=styles['Normal'], fontSize=12, alignment=TA_CENTER, textColor=colors.HexColor('#2563eb'))))
-    elements.append(Spacer(1, 3*mm))
-    elements.append(Paragraph("Please retain this invoice for your records.", ParagraphStyle('Footer', parent=styles['Normal'], fontSize=9, alignment=TA_CENTER, textColor=colors.grey)))
+    elements.extend(copy.copy(flowable) for flowable in shared['footer'])
     
     doc.build(elements)
     buffer.seek(0)
     return buffer
+
+def render_invoice_pdf(invoice):
+    # Process-pool entry point: takes a plain invoice snapshot and returns the PDF bytes
+    return generate_invoice_pdf(invoice).getvalue()
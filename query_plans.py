@@ -0,0 +1,148 @@
+import random
+import re
+from datetime import datetime, timedelta
+
+from config import Config
+from models import db, Product, Customer, Invoice, InvoiceItem, ActivityLog
+from rollups import rebuild_daily_sales
+
+SQLITE_FULL_SCAN = re.compile(r'^SCAN (TABLE )?\w+$')
+
+
+def day_range(day):
+    start = datetime.combine(day, datetime.min.time())
+    return start, start + timedelta(days=1)
+
+
+def hot_queries(today=None):
+    # Mirrors the filters used by the dashboard, invoice list, reports and invoice views
+    start, end = day_range(today or datetime.utcnow().date())
+    return [
+        ('invoices_in_range', db.select(Invoice.id, Invoice.total_amount).where(
+            Invoice.created_at >= start, Invoice.created_at < end
+        )),
+        ('recent_invoices', db.select(Invoice.id).order_by(Invoice.created_at.desc()).limit(10)),
+        ('customer_invoices', db.select(Invoice.id).where(Invoice.customer_id == 1)),
+        ('invoice_items', db.select(InvoiceItem.id).where(InvoiceItem.invoice_id == 1)),
+        ('product_sales', db.select(InvoiceItem.id).where(InvoiceItem.product_id == 1)),
+        ('low_stock_products', db.select(Product.id).where(
+            Product.is_active == True, Product.quantity <= Config.LOW_STOCK_THRESHOLD
+        )),
+        ('recent_activity', db.select(ActivityLog.id).order_by(ActivityLog.created_at.desc()).limit(10)),
+        ('activity_for_user', db.select(ActivityLog.id).where(
+            ActivityLog.user_id == 1, ActivityLog.created_at >= start, ActivityLog.created_at < end
+        ).order_by(ActivityLog.created_at.desc()).limit(50)),
+        ('invoices_page', db.select(Invoice.id).where(
+            db.tuple_(Invoice.created_at, Invoice.id) < db.tuple_(db.literal(end, Invoice.created_at.type), db.literal(0))
+        ).order_by(Invoice.created_at.desc(), Invoice.id.desc()).limit(21)),
+        ('products_page', db.select(Product.id).where(
+            db.tuple_(Product.name, Product.id) > db.tuple_(db.literal('m'), db.literal(0))
+        ).order_by(Product.name, Product.id).limit(21)),
+        ('catalog_changes', db.select(Product.id).where(
+            db.tuple_(Product.updated_at, Product.id) > db.tuple_(db.literal(start, Product.updated_at.type), db.literal(0))
+        ).order_by(Product.updated_at, Product.id).limit(501)),
+        ('customers_page', db.select(Customer.id).where(
+            db.tuple_(Customer.name, Customer.id) > db.tuple_(db.literal('m'), db.literal(0))
+        ).order_by(Customer.name, Customer.id).limit(21)),
+    ]
+
+
+def explain_plan(conn, stmt):
+    sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True}))
+    if conn.dialect.name == 'sqlite':
+        return [row[-1] for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql)]
+    return [row[0] for row in conn.exec_driver_sql('EXPLAIN ' + sql)]
+
+
+def is_sequential_scan(dialect, plan):
+    if dialect == 'sqlite':
+        return any(SQLITE_FULL_SCAN.match(line.strip()) for line in plan)
+    return any('Seq Scan' in line for line in plan)
+
+
+def check_query_plans(today=None):
+    results = []
+    with db.engine.connect() as conn:
+        for name, stmt in hot_queries(today):
+            plan = explain_plan(conn, stmt)
+            results.append({
+                'name': name,
+                'plan': plan,
+                'ok': not is_sequential_scan(conn.dialect.name, plan)
+            })
+    return results
+
+
+def seed_invoices(count, batch_size=5000, days=365, products=1000, customers=1000):
+    # Bulk Core inserts so a million-invoice database can be built in minutes
+    now = datetime.utcnow()
+    existing = db.session.query(db.func.count(Product.id)).scalar()
+    if existing < products:
+        db.session.execute(Product.__table__.insert(), [{
+            'name': f'Seed Product {i}',
+            'barcode': f'SEED{now:%Y%m%d%H%M%S}{i:06d}',
+            'price': random.randint(10, 500),
+            'cost_price': random.randint(5, 400),
+            'quantity': random.randint(0, 500),
+            'is_active': True,
+            'created_at': now,
+            'updated_at': now,
+        } for i in range(products - existing)])
+    existing = db.session.query(db.func.count(Customer.id)).scalar()
+    if existing < customers:
+        db.session.execute(Customer.__table__.insert(), [{
+            'name': f'Seed Customer {i}',
+            'mobile': f'9{now:%m%d%H%M%S}{i:05d}'[:20],
+            'created_at': now,
+            'updated_at': now,
+        } for i in range(customers - existing)])
+    db.session.commit()
+
+    product_rows = db.session.query(Product.id, Product.name, Product.price).all()
+    # None stands for a walk-in sale
+    customer_choices = [cid for (cid,) in db.session.query(Customer.id)] + [None]
+    prefix = f'SEED-{now:%Y%m%d%H%M%S}'
+
+    for offset in range(0, count, batch_size):
+        invoices, lines = [], {}
+        for i in range(offset, min(offset + batch_size, count)):
+            number = f'{prefix}-{i:08d}'
+            picked = random.sample(product_rows, min(3, len(product_rows)))
+            items = []
+            for product_id, name, price in picked:
+                quantity = random.randint(1, 5)
+                items.append({
+                    'product_id': product_id,
+                    'product_name': name,
+                    'quantity': quantity,
+                    'unit_price': price,
+                    'total_price': price * quantity,
+                })
+            subtotal = sum(item['total_price'] for item in items)
+            invoices.append({
+                'invoice_number': number,
+                'customer_id': random.choice(customer_choices),
+                'subtotal': subtotal,
+                'tax_amount': 0,
+                'discount_amount': 0,
+                'total_amount': subtotal,
+                'payment_method': 'cash',
+                'payment_status': 'paid',
+                'created_at': now - timedelta(seconds=random.randint(0, days * 86400)),
+            })
+            lines[number] = items
+
+        db.session.execute(Invoice.__table__.insert(), invoices)
+        ids = dict(db.session.query(Invoice.invoice_number, Invoice.id).filter(
+            Invoice.invoice_number.in_(list(lines))
+        ))
+        db.session.execute(InvoiceItem.__table__.insert(), [
+            {**item, 'invoice_id': ids[number]} for number, items in lines.items() for item in items
+        ])
+        db.session.commit()
+
+    rebuild_daily_sales()
+    # Fresh statistics so the planner sees the seeded table sizes
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql('ANALYZE')
+    return count
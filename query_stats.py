@@ -0,0 +1,59 @@
+import threading
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryCounter:
+    # Counts SQL statements per request; background threads such as the audit writer run
+    # outside a request context and are not counted
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.queries = 0
+        self.endpoints = {}
+
+    def init_app(self, app):
+        event.listen(Engine, 'before_cursor_execute', self._on_execute)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'query_count' in g:
+            g.query_count += 1
+
+    def _start(self):
+        g.query_count = 0
+
+    def _finish(self, response):
+        count = g.get('query_count')
+        # A generated body (CSV, ZIP exports) runs its queries after this hook, so any count
+        # here would be short; such responses get no header and stay out of the stats. Files
+        # from send_file are streamed too but passed through, with every query already run.
+        if count is None or (response.is_streamed and not response.direct_passthrough):
+            return response
+        response.headers['X-Query-Count'] = str(count)
+        endpoint = request.endpoint or 'unknown'
+        with self._lock:
+            self.requests += 1
+            self.queries += count
+            stats = self.endpoints.setdefault(endpoint, [0, 0])
+            stats[0] += 1
+            stats[1] += count
+        return response
+
+    def stats(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'queries': self.queries,
+                'queries_per_request': round(self.queries / self.requests, 2) if self.requests else 0.0,
+                'endpoints': {
+                    endpoint: {'requests': n, 'queries': q, 'queries_per_request': round(q / n, 2)}
+                    for endpoint, (n, q) in sorted(self.endpoints.items())
+                }
+            }
+
+
+query_counter = QueryCounter()
@@ -0,0 +1,145 @@
+from functools import lru_cache
+
+from config import Config
+
+STORE_NAME = 'GROCERY STORE'
+STORE_LINES = (
+    'Your Trusted Shopping Partner',
+    '123 Main Street, Karachi, Pakistan',
+    'Phone: +92 21 1234567',
+)
+FOOTER_LINES = (
+    'Thank you for shopping with us!',
+    'Please retain this receipt for your records.',
+)
+
+# ESC/POS commands understood by common 58/80mm thermal printers
+ESC_INIT = b'\x1b@'
+ESC_ALIGN_LEFT = b'\x1ba\x00'
+ESC_ALIGN_CENTER = b'\x1ba\x01'
+ESC_BOLD_ON = b'\x1bE\x01'
+ESC_BOLD_OFF = b'\x1bE\x00'
+GS_SIZE_DOUBLE = b'\x1d!\x11'
+GS_SIZE_NORMAL = b'\x1d!\x00'
+ESC_FEED = b'\x1bd\x04'
+GS_CUT = b'\x1dVB\x00'
+ENCODING = 'cp437'
+
+# Line styles: (ESC/POS prefix, suffix)
+STYLES = {
+    'plain': (b'', b''),
+    'center': (ESC_ALIGN_CENTER, ESC_ALIGN_LEFT),
+    'bold': (ESC_BOLD_ON, ESC_BOLD_OFF),
+    'title': (ESC_ALIGN_CENTER + ESC_BOLD_ON + GS_SIZE_DOUBLE, GS_SIZE_NORMAL + ESC_BOLD_OFF + ESC_ALIGN_LEFT),
+}
+
+
+def money(value):
+    return f'{float(value or 0):,.2f}'
+
+
+@lru_cache(maxsize=8)
+def layout(width):
+    # Column formats are built once per paper width and reused for every receipt
+    name_width = width - 25
+    return {
+        'rule': '-' * width,
+        'item': f'{{:<{name_width}.{name_width}}}{{:>4}}{{:>10}}{{:>11}}',
+        'amounts': f'{{:>{name_width + 4}}}{{:>10}}{{:>11}}',
+        'total': f'{{:>{width - 14}}}{{:>14}}',
+        'field': '{:<10}{}',
+        'name_width': name_width,
+        'header': ['Item', 'Qty', 'Price', 'Total'],
+    }
+
+
+@lru_cache(maxsize=8)
+def static_lines(width):
+    fmt = layout(width)
+    header = [('title', STORE_NAME)] + [('center', line) for line in STORE_LINES] + [('plain', fmt['rule'])]
+    footer = [('plain', fmt['rule'])] + [('center', line) for line in FOOTER_LINES]
+    return header, footer
+
+
+@lru_cache(maxsize=8)
+def static_escpos(width):
+    header, footer = static_lines(width)
+    return ESC_INIT + encode_lines(header), encode_lines(footer) + ESC_FEED + GS_CUT
+
+
+def wrap(text, width):
+    words, lines, current = text.split(), [], ''
+    for word in words:
+        while len(word) > width:
+            if current:
+                lines.append(current)
+                current = ''
+            lines.append(word[:width])
+            word = word[width:]
+        if current and len(current) + 1 + len(word) > width:
+            lines.append(current)
+            current = word
+        else:
+            current = f'{current} {word}' if current else word
+    if current or not lines:
+        lines.append(current)
+    return lines
+
+
+def body_lines(invoice, width):
+    fmt = layout(width)
+    customer = invoice.customer
+    lines = [
+        ('plain', fmt['field'].format('Invoice:', invoice.invoice_number)),
+        ('plain', fmt['field'].format('Date:', invoice.created_at.strftime('%d/%m/%Y %H:%M'))),
+        ('plain', fmt['field'].format('Customer:', customer.name if customer else 'Walk-in Customer')),
+    ]
+    if customer and customer.mobile:
+        lines.append(('plain', fmt['field'].format('Mobile:', customer.mobile)))
+    lines.append(('plain', fmt['rule']))
+    lines.append(('bold', fmt['item'].format(*fmt['header'])))
+    lines.append(('plain', fmt['rule']))
+
+    for item in invoice.items:
+        name = item.product_name
+        if len(name) <= fmt['name_width']:
+            lines.append(('plain', fmt['item'].format(name, item.quantity, money(item.unit_price), money(item.total_price))))
+        else:
+            lines.extend(('plain', part) for part in wrap(name, width))
+            lines.append(('plain', fmt['amounts'].format(item.quantity, money(item.unit_price), money(item.total_price))))
+
+    lines.append(('plain', fmt['rule']))
+    lines.append(('plain', fmt['total'].format('Subtotal:', money(invoice.subtotal))))
+    lines.append(('plain', fmt['total'].format(f'Tax ({float(invoice.tax_rate or 0):g}%):', money(invoice.tax_amount))))
+    if invoice.discount_amount and invoice.discount_amount > 0:
+        lines.append(('plain', fmt['total'].format(
+            f'Discount ({float(invoice.discount_percent or 0):g}%):', '-' + money(invoice.discount_amount)
+        )))
+    lines.append(('bold', fmt['total'].format('TOTAL: Rs.', money(invoice.total_amount))))
+    lines.append(('plain', fmt['field'].format('Payment:', f'{invoice.payment_method.upper()} ({invoice.payment_status.upper()})')))
+    if invoice.notes:
+        lines.extend(('plain', part) for part in wrap(f'Notes: {invoice.notes}', width))
+    return lines
+
+
+def encode_lines(lines):
+    out = []
+    for style, text in lines:
+        prefix, suffix = STYLES[style]
+        out.append(prefix + text.encode(ENCODING, errors='replace') + suffix + b'\n')
+    return b''.join(out)
+
+
+def render_text(invoice, width=None):
+    width = width or Config.RECEIPT_WIDTH
+    header, footer = static_lines(width)
+    out = []
+    for style, text in header + body_lines(invoice, width) + footer:
+        out.append(text.center(width).rstrip() if style in ('center', 'title') else text)
+    return '\n'.join(out) + '\n'
+
+
+def render_escpos(invoice, width=None):
+    width = width or Config.RECEIPT_WIDTH
+    header, footer = static_escpos(width)
+    return header + encode_lines(body_lines(invoice, width)) + footer
@@ -0,0 +1,123 @@
+import csv
+import io
+from datetime import datetime, timedelta
+
+from models import db, Product, Category, Customer, Invoice
+
+EXPORT_BATCH_SIZE = 1000
+
+
+def filter_created_between(query, column, date_from, date_to):
+    # Half-open [date_from, date_to + 1 day) on the raw timestamp keeps the created_at index usable
+    if date_from:
+        query = query.filter(column >= datetime.strptime(date_from, '%Y-%m-%d'))
+    if date_to:
+        query = query.filter(column < datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1))
+    return query
+
+
+def sales_report(date_from, date_to):
+    stmt = db.select(
+        Invoice.invoice_number,
+        Invoice.created_at,
+        Customer.name,
+        Invoice.subtotal,
+        Invoice.tax_amount,
+        Invoice.discount_amount,
+        Invoice.total_amount,
+        Invoice.payment_method
+    ).outerjoin(Customer, Invoice.customer_id == Customer.id)
+    stmt = filter_created_between(stmt, Invoice.created_at, date_from, date_to).order_by(Invoice.created_at.desc())
+
+    def format_row(row):
+        return [
+            row.invoice_number,
+            row.created_at.strftime('%Y-%m-%d %H:%M'),
+            row.name or 'Walk-in',
+            float(row.subtotal),
+            float(row.tax_amount or 0),
+            float(row.discount_amount or 0),
+            float(row.total_amount),
+            row.payment_method
+        ]
+
+    header = ['Invoice Number', 'Date', 'Customer', 'Subtotal', 'Tax', 'Discount', 'Total', 'Payment Method']
+    return header, stmt, format_row
+
+
+def inventory_report(date_from, date_to):
+    stmt = db.select(
+        Product.barcode,
+        Product.name,
+        Category.name.label('category_name'),
+        Product.price,
+        Product.cost_price,
+        Product.quantity
+    ).outerjoin(Category, Product.category_id == Category.id).where(
+        Product.is_active == True
+    ).order_by(Product.name)
+
+    def format_row(row):
+        return [
+            row.barcode,
+            row.name,
+            row.category_name or '',
+            float(row.price),
+            float(row.cost_price or 0),
+            row.quantity,
+            float(row.price * (row.quantity or 0))
+        ]
+
+    header = ['Barcode', 'Name', 'Category', 'Price', 'Cost Price', 'Quantity', 'Stock Value']
+    return header, stmt, format_row
+
+
+def customers_report(date_from, date_to):
+    counts = db.select(
+        Invoice.customer_id,
+        db.func.count(Invoice.id).label('invoice_count')
+    ).group_by(Invoice.customer_id).subquery()
+    stmt = db.select(
+        Customer.name,
+        Customer.mobile,
+        Customer.email,
+        Customer.total_purchases,
+        Customer.loyalty_points,
+        counts.c.invoice_count
+    ).outerjoin(counts, counts.c.customer_id == Customer.id).order_by(Customer.name)
+
+    def format_row(row):
+        return [
+            row.name,
+            row.mobile,
+            row.email or '',
+            float(row.total_purchases or 0),
+            row.loyalty_points,
+            row.invoice_count or 0
+        ]
+
+    header = ['Name', 'Mobile', 'Email', 'Total Purchases', 'Loyalty Points', 'Invoice Count']
+    return header, stmt, format_row
+
+
+REPORTS = {
+    'sales': sales_report,
+    'inventory': inventory_report,
+    'customers': customers_report,
+}
+
+
+def stream_csv(header, stmt, format_row, batch_size=EXPORT_BATCH_SIZE):
+    # yield_per streams from a server-side cursor where the driver supports it, so only one
+    # batch of rows and one CSV chunk are held in memory at a time
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+    for rows in result.partitions():
+        writer.writerows(format_row(row) for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,115 @@
+from datetime import date, timedelta
+
+from models import db, Invoice, DailySales, dialect_insert
+
+SUMMED_COLUMNS = ('invoice_count', 'subtotal', 'tax_amount', 'discount_amount', 'total_amount')
+
+
+def record_daily_sale(invoice):
+    record_daily_sales([invoice])
+
+
+def record_daily_sales(invoices):
+    # Called inside the invoice transaction, so the rollup commits or rolls back with the sales;
+    # a batch of invoices costs one upsert per day rather than one per invoice
+    days = {}
+    for invoice in invoices:
+        day = invoice.created_at.date()
+        values = days.setdefault(day, dict({column: 0 for column in SUMMED_COLUMNS}, day=day))
+        values['invoice_count'] += 1
+        values['subtotal'] += invoice.subtotal
+        values['tax_amount'] += invoice.tax_amount or 0
+        values['discount_amount'] += invoice.discount_amount or 0
+        values['total_amount'] += invoice.total_amount
+
+    table = DailySales.__table__
+    for values in days.values():
+        stmt = dialect_insert(table)
+        if stmt is not None:
+            db.session.execute(stmt.values(**values).on_conflict_do_update(
+                index_elements=[table.c.day],
+                set_={column: table.c[column] + stmt.excluded[column] for column in SUMMED_COLUMNS}
+            ))
+            continue
+        updated = db.session.execute(table.update().where(table.c.day == values['day']).values(
+            {column: table.c[column] + values[column] for column in SUMMED_COLUMNS}
+        )).rowcount
+        if not updated:
+            db.session.execute(table.insert().values(**values))
+
+
+def rebuild_daily_sales(since=None):
+    table = DailySales.__table__
+    day = db.func.date(Invoice.created_at)
+    source = db.select(
+        day,
+        db.func.count(Invoice.id),
+        db.func.coalesce(db.func.sum(Invoice.subtotal), 0),
+        db.func.coalesce(db.func.sum(Invoice.tax_amount), 0),
+        db.func.coalesce(db.func.sum(Invoice.discount_amount), 0),
+        db.func.coalesce(db.func.sum(Invoice.total_amount), 0)
+    ).group_by(day)
+
+    delete = table.delete()
+    if since:
+        source = source.where(Invoice.created_at >= since)
+        delete = delete.where(table.c.day >= since)
+
+    db.session.execute(delete)
+    db.session.execute(table.insert().from_select(['day'] + list(SUMMED_COLUMNS), source))
+    db.session.commit()
+    return DailySales.query.count()
+
+
+def daily_sales_since(start):
+    return DailySales.query.filter(DailySales.day >= start).order_by(DailySales.day).all()
+
+
+def sales_summary(today):
+    week_ago = today - timedelta(days=7)
+    month_start = today.replace(day=1)
+    summary = {'today_sales': 0, 'weekly_sales': 0, 'monthly_sales': 0, 'today_invoices': 0}
+    for row in daily_sales_since(min(week_ago, month_start)):
+        if row.day == today:
+            summary['today_sales'] += row.total_amount
+            summary['today_invoices'] += row.invoice_count
+        if row.day >= week_ago:
+            summary['weekly_sales'] += row.total_amount
+        if row.day >= month_start:
+            summary['monthly_sales'] += row.total_amount
+    return summary
+
+
+def month_starts(today, count):
+    year, month = today.year, today.month
+    starts = []
+    for _ in range(count):
+        starts.append(date(year, month, 1))
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+    return starts[::-1]
+
+
+def sales_series(today, days=7, months=6):
+    # One read of the rollup covers both the daily and the calendar-month series
+    months_from = month_starts(today, months)
+    first_day = today - timedelta(days=days - 1)
+    by_day = {}
+    by_month = {start: 0 for start in months_from}
+    for row in daily_sales_since(min(first_day, months_from[0])):
+        by_day[row.day] = row.total_amount
+        month = row.day.replace(day=1)
+        if month in by_month:
+            by_month[month] += row.total_amount
+
+    daily = []
+    for offset in range(days - 1, -1, -1):
+        day = today - timedelta(days=offset)
+        daily.append({
+            'date': day.strftime('%Y-%m-%d'),
+            'day': day.strftime('%a'),
+            'sales': float(by_day.get(day, 0))
+        })
+    monthly = [{'month': start.strftime('%b %Y'), 'sales': float(total)} for start, total in by_month.items()]
+    return daily, monthly
@@ -0,0 +1,215 @@
+import bisect
+import re
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import Float, Integer, case, column, event, false, func, or_, text
+from sqlalchemy.orm import joinedload
+
+from config import Config
+from models import db, Product
+
+
+def escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def active_products():
+    return Product.query.options(joinedload(Product.category)).filter(Product.is_active == True)
+
+
+class TrigramSearch:
+    name = 'pg_trgm'
+
+    def setup(self):
+        with db.engine.begin() as conn:
+            conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products USING gin (name gin_trgm_ops)'))
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_products_barcode_trgm ON products USING gin (barcode gin_trgm_ops)'))
+
+    def filter(self, q):
+        pattern = escape_like(q)
+        # Both ILIKE forms are served by the trigram GIN indexes
+        return or_(
+            Product.name.ilike(f'%{pattern}%', escape='\\'),
+            Product.barcode.ilike(f'%{pattern}%', escape='\\')
+        )
+
+    def search(self, q, limit=20):
+        pattern = escape_like(q)
+        prefix_first = case((Product.name.ilike(f'{pattern}%', escape='\\'), 0), else_=1)
+        return active_products().filter(
+            or_(self.filter(q), Product.name.op('%')(q))
+        ).order_by(
+            prefix_first, func.similarity(Product.name, q).desc(), Product.name
+        ).limit(limit).all()
+
+
+class FtsSearch:
+    name = 'fts5'
+
+    TRIGGERS = (
+        """CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+            INSERT INTO products_fts(rowid, name, barcode) VALUES (new.id, new.name, new.barcode);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+            INSERT INTO products_fts(products_fts, rowid, name, barcode) VALUES ('delete', old.id, old.name, old.barcode);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, barcode ON products BEGIN
+            INSERT INTO products_fts(products_fts, rowid, name, barcode) VALUES ('delete', old.id, old.name, old.barcode);
+            INSERT INTO products_fts(rowid, name, barcode) VALUES (new.id, new.name, new.barcode);
+        END""",
+    )
+
+    def setup(self):
+        with db.engine.begin() as conn:
+            exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'products_fts'")).first()
+            # External-content table: the index lives in the shadow table, rows stay in products
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts "
+                "USING fts5(name, barcode, content='products', content_rowid='id')"
+            ))
+            for trigger in self.TRIGGERS:
+                conn.execute(text(trigger))
+            if not exists:
+                conn.execute(text("INSERT INTO products_fts(products_fts) VALUES ('rebuild')"))
+
+    @staticmethod
+    def match_expression(q):
+        # Every token must match as a prefix, e.g. "chase up" -> "chase"* "up"*
+        return ' '.join(f'"{token}"*' for token in re.findall(r'\w+', q.lower()))
+
+    def filter(self, q):
+        if not self.match_expression(q):
+            return false()
+        return Product.id.in_(text(
+            'SELECT rowid FROM products_fts WHERE products_fts MATCH :match'
+        ).bindparams(match=self.match_expression(q)).columns(column('rowid', Integer)))
+
+    def search(self, q, limit=20):
+        if not self.match_expression(q):
+            return []
+        matches = text(
+            'SELECT rowid AS id, rank FROM products_fts WHERE products_fts MATCH :match'
+        ).bindparams(match=self.match_expression(q)).columns(column('id', Integer), column('rank', Float)).subquery('fts')
+        return active_products().join(matches, matches.c.id == Product.id).order_by(
+            matches.c.rank, Product.name
+        ).limit(limit).all()
+
+
+def ngrams(value, size=3):
+    return {value[i:i + size] for i in range(len(value) - size + 1)}
+
+
+class NgramSearch:
+    name = 'ngram'
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else Config.SEARCH_INDEX_TTL
+        self._lock = threading.Lock()
+        self._built_at = None
+        self._grams = {}
+        self._entries = {}
+        self._names = []
+        self._barcodes = []
+        for action in ('after_insert', 'after_update', 'after_delete'):
+            event.listen(Product, action, lambda *args: self.mark_stale())
+
+    def setup(self):
+        pass
+
+    def mark_stale(self):
+        self._built_at = None
+
+    def ensure_fresh(self):
+        if self._built_at is not None and time.monotonic() - self._built_at < self.ttl:
+            return
+        with self._lock:
+            if self._built_at is not None and time.monotonic() - self._built_at < self.ttl:
+                return
+            grams = defaultdict(set)
+            entries = {}
+            rows = db.session.query(Product.id, Product.name, Product.barcode, Product.is_active)
+            for product_id, name, barcode, is_active in rows:
+                name = (name or '').lower()
+                entries[product_id] = (name, (barcode or '').lower(), bool(is_active))
+                for gram in ngrams(name):
+                    grams[gram].add(product_id)
+            self._names = sorted((entry[0], product_id) for product_id, entry in entries.items())
+            self._barcodes = sorted((entry[1], product_id) for product_id, entry in entries.items())
+            self._grams, self._entries = grams, entries
+            self._built_at = time.monotonic()
+
+    def matching_ids(self, q, active_only=False):
+        self.ensure_fresh()
+        q = q.lower().strip()
+        grams = ngrams(q)
+        if grams:
+            postings = sorted((self._grams.get(gram, set()) for gram in grams), key=len)
+            candidates = set.intersection(*postings)
+            candidates |= set(self.prefix_ids(self._barcodes, q))
+        else:
+            # Too short for a trigram, so match name and barcode prefixes rather than scan every entry
+            candidates = set(self.prefix_ids(self._names, q)) | set(self.prefix_ids(self._barcodes, q))
+
+        hits = []
+        for product_id in candidates:
+            name, barcode, is_active = self._entries[product_id]
+            if active_only and not is_active:
+                continue
+            if q in name or barcode.startswith(q):
+                hits.append((0 if name.startswith(q) else 1, len(name), name, product_id))
+        return [hit[-1] for hit in sorted(hits)]
+
+    @staticmethod
+    def prefix_ids(index, q):
+        # Names and barcodes are kept sorted so prefix matches are a bisect plus a short scan
+        for position in range(bisect.bisect_left(index, (q,)), len(index)):
+            value, product_id = index[position]
+            if not value.startswith(q):
+                break
+            yield product_id
+
+    def filter(self, q):
+        ids = self.matching_ids(q)
+        return Product.id.in_(ids) if ids else false()
+
+    def search(self, q, limit=20):
+        ids = self.matching_ids(q, active_only=True)[:limit]
+        if not ids:
+            return []
+        by_id = {p.id: p for p in active_products().filter(Product.id.in_(ids))}
+        return [by_id[pid] for pid in ids if pid in by_id]
+
+
+BACKENDS = {
+    'pg_trgm': TrigramSearch,
+    'fts5': FtsSearch,
+    'ngram': NgramSearch,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_search_backend():
+    choice = Config.SEARCH_BACKEND
+    if choice == 'auto':
+        choice = {'postgresql': 'pg_trgm', 'sqlite': 'fts5'}.get(db.engine.dialect.name, 'ngram')
+    try:
+        backend = BACKENDS[choice]()
+        backend.setup()
+    except Exception as e:
+        print(f"[WARNING] Search backend '{choice}' unavailable ({e}). Falling back to in-memory n-gram index.")
+        backend = NgramSearch()
+    return backend
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_search_backend()
+    return _backend
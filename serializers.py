@@ -0,0 +1,41 @@
+from sqlalchemy.orm import joinedload, selectinload
+
+from models import db, Customer, Invoice, Product
+
+
+def invoice_counts(customer_ids):
+    # One aggregate query for a page of customers instead of a COUNT per customer
+    if not customer_ids:
+        return {}
+    return dict(db.session.query(
+        Invoice.customer_id, db.func.count(Invoice.id)
+    ).filter(Invoice.customer_id.in_(customer_ids)).group_by(Invoice.customer_id))
+
+
+def with_invoice_counts(query):
+    # For whole-table listings: join the grouped counts instead of sending every id back in an IN list
+    counts = db.session.query(
+        Invoice.customer_id, db.func.count(Invoice.id).label('invoice_count')
+    ).group_by(Invoice.customer_id).subquery()
+    return query.outerjoin(counts, counts.c.customer_id == Customer.id).add_columns(counts.c.invoice_count)
+
+
+def serialize_customers(customers):
+    customers = list(customers)
+    counts = invoice_counts([c.id for c in customers])
+    return [c.to_dict(invoice_count=counts.get(c.id, 0)) for c in customers]
+
+
+def serialize_counted_customers(rows):
+    return [customer.to_dict(invoice_count=count or 0) for customer, count in rows]
+
+
+def invoice_load_options(items=True):
+    options = [joinedload(Invoice.customer), joinedload(Invoice.created_by_user)]
+    if items:
+        options.append(selectinload(Invoice.items))
+    return options
+
+
+def product_load_options():
+    return [joinedload(Product.category)]
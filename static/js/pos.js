@@ -1,5 +1,25 @@
 let cart = [];
 const TAX_RATE = 0.18;
+const CHECKOUT_TIMEOUT_MS = 8000;
+const CHECKOUT_RETRIES = 3;
+const OUTBOX_KEY = 'pos.outbox';
+const OUTBOX_FAILED_KEY = 'pos.outbox.failed';
+const OUTBOX_BATCH_SIZE = 50;
+const OUTBOX_FLUSH_INTERVAL_MS = 30000;
+const GRID_PAGE_SIZE = 100;
+const GRID_ROW_HEIGHT = 104;
+const GRID_OVERSCAN_ROWS = 3;
+
+// Products are fetched a page at a time and only the rows in view are rendered
+const catalog = {
+    items: [],
+    cursor: null,
+    hasMore: true,
+    loading: false,
+    query: '',
+    category: 'all',
+    generation: 0
+};
 
 document.addEventListener('DOMContentLoaded', function() {
     const productSearch = document.getElementById('productSearch');
@@ -8,17 +28,13 @@ document.addEventListener('DOMContentLoaded', function() {
     const discountInput = document.getElementById('discountPercent');
     const categoryFilters = document.querySelectorAll('.category-filter');
     
-    document.querySelectorAll('.product-card').forEach(card => {
-        card.addEventListener('click', function() {
-            const product = JSON.parse(this.dataset.product);
-            addToCart(product);
-        });
-    });
+    initProductGrid();
+    initCustomerTypeahead();
+    initOutbox();
     
     if (productSearch) {
         productSearch.addEventListener('input', debounce(function() {
-            const query = this.value.toLowerCase();
-            filterProducts(query);
+            setCatalogFilter({query: this.value.trim()});
         }, 300));
         
         productSearch.addEventListener('keypress', function(e) {
@@ -37,8 +53,7 @@ document.addEventListener('DOMContentLoaded', function() {
             categoryFilters.forEach(b => b.classList.remove('active'));
             this.classList.add('active');
             
-            const category = this.dataset.category;
-            filterByCategory(category);
+            setCatalogFilter({category: this.dataset.category});
         });
     });
     
@@ -194,24 +209,33 @@ async function processCheckout() {
     checkoutBtn.disabled = true;
     checkoutBtn.innerHTML = '<span class="spinner-border spinner-border-sm"></span> Processing...';
     
+    const sale = {
+        client_ref: newIdempotencyKey(),
+        idempotency_key: newIdempotencyKey(),
+        customer_id: customerId,
+        items: cart.map(item => ({
+            product_id: item.product_id,
+            quantity: item.quantity
+        })),
+        discount_percent: discountPercent,
+        payment_method: paymentMethod
+    };
+    
+    let response;
     try {
-        const response = await fetch('/api/invoice/create', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                customer_id: customerId,
-                items: cart.map(item => ({
-                    product_id: item.product_id,
-                    quantity: item.quantity
-                })),
-                discount_percent: discountPercent,
-                payment_method: paymentMethod
-            })
-        });
-        
-        const data = await response.json();
+        response = await postWithRetry('/api/invoice/create', sale, sale.idempotency_key);
+    } catch (error) {
+        // Unreachable server: keep the sale in the outbox; it is sent later with the same
+        // idempotency key, so a request that did reach the server is not billed twice
+        console.error('Checkout error:', error);
+        enqueueSale(sale);
+        showToast('Server unreachable. Sale saved offline and will sync automatically.', 'warning');
+        resetAfterSale();
+        return;
+    }
+    
+    try {
+        const data = await response.json().catch(() => ({error: `Server error ${response.status}. The sale was not saved.`}));
         
         if (data.error) {
             showToast(data.error, 'error');
@@ -221,15 +245,8 @@ async function processCheckout() {
         }
         
         showInvoiceModal(data.invoice);
-        
-        cart = [];
-        renderCart();
-        updateTotals();
-        document.getElementById('discountPercent').value = 0;
-        document.getElementById('customerSelect').value = '';
-        
-        checkoutBtn.disabled = false;
-        checkoutBtn.innerHTML = '<i class="bi bi-check-circle"></i> Complete Sale';
+        resetAfterSale();
+        flushOutbox();
         
     } catch (error) {
         console.error('Checkout error:', error);
@@ -239,6 +256,159 @@ async function processCheckout() {
     }
 }
 
+function resetAfterSale() {
+    cart = [];
+    renderCart();
+    updateTotals();
+    document.getElementById('discountPercent').value = 0;
+    selectCustomer('', '');
+    
+    const checkoutBtn = document.getElementById('checkoutBtn');
+    checkoutBtn.disabled = false;
+    checkoutBtn.innerHTML = '<i class="bi bi-check-circle"></i> Complete Sale';
+}
+
+// Sales that could not reach the server wait in localStorage and are sent through
+// /api/invoices/batch once the connection is back
+let outboxFlushing = false;
+
+function initOutbox() {
+    window.addEventListener('online', flushOutbox);
+    setInterval(flushOutbox, OUTBOX_FLUSH_INTERVAL_MS);
+    updateOutboxStatus();
+    flushOutbox();
+}
+
+function readOutbox(key = OUTBOX_KEY) {
+    try {
+        return JSON.parse(localStorage.getItem(key)) || [];
+    } catch (error) {
+        return [];
+    }
+}
+
+function writeOutbox(sales, key = OUTBOX_KEY) {
+    localStorage.setItem(key, JSON.stringify(sales));
+}
+
+function enqueueSale(sale) {
+    const sales = readOutbox();
+    sales.push({...sale, queued_at: new Date().toISOString()});
+    writeOutbox(sales);
+    updateOutboxStatus();
+}
+
+async function flushOutbox() {
+    if (outboxFlushing || (navigator.onLine === false)) return;
+    let sales = readOutbox();
+    if (sales.length === 0) return;
+    
+    outboxFlushing = true;
+    let synced = 0;
+    const failed = [];
+    try {
+        while (sales.length > 0) {
+            const batch = sales.slice(0, OUTBOX_BATCH_SIZE);
+            const controller = new AbortController();
+            const timer = setTimeout(() => controller.abort(), CHECKOUT_TIMEOUT_MS);
+            let data;
+            try {
+                const response = await fetch('/api/invoices/batch', {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify({invoices: batch}),
+                    signal: controller.signal
+                });
+                if (!response.ok) break;
+                data = await response.json();
+            } finally {
+                clearTimeout(timer);
+            }
+            
+            const done = new Set();
+            data.results.forEach(result => {
+                const sale = batch[result.index];
+                done.add(sale.client_ref);
+                if (result.status === 'error') {
+                    failed.push({...sale, error: result.error});
+                } else {
+                    synced++;
+                }
+            });
+            // Re-read so sales queued while this request was in flight are kept
+            sales = readOutbox().filter(sale => !done.has(sale.client_ref));
+            writeOutbox(sales);
+        }
+    } catch (error) {
+        console.error('Outbox sync error:', error);
+    } finally {
+        outboxFlushing = false;
+    }
+    
+    if (failed.length > 0) {
+        writeOutbox(readOutbox(OUTBOX_FAILED_KEY).concat(failed), OUTBOX_FAILED_KEY);
+        showToast(`${failed.length} offline sale(s) were rejected: ${escapeHtml(failed[0].error)}`, 'error');
+    }
+    if (synced > 0) {
+        showToast(`${synced} offline sale(s) synced.`);
+    }
+    updateOutboxStatus();
+}
+
+function updateOutboxStatus() {
+    const status = document.getElementById('outboxStatus');
+    if (!status) return;
+    const waiting = readOutbox().length;
+    const rejected = readOutbox(OUTBOX_FAILED_KEY).length;
+    const parts = [];
+    if (waiting > 0) parts.push(`${waiting} sale(s) waiting to sync`);
+    if (rejected > 0) parts.push(`${rejected} rejected`);
+    status.textContent = parts.join(', ');
+    status.classList.toggle('d-none', parts.length === 0);
+}
+
+function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+}
+
+// Every attempt reuses the same Idempotency-Key, so the server creates the invoice at most once
+async function postWithRetry(url, body, idempotencyKey) {
+    let lastError;
+    for (let attempt = 0; attempt <= CHECKOUT_RETRIES; attempt++) {
+        if (attempt > 0) {
+            await new Promise(resolve => setTimeout(resolve, 250 * 2 ** (attempt - 1)));
+        }
+        
+        const controller = new AbortController();
+        const timer = setTimeout(() => controller.abort(), CHECKOUT_TIMEOUT_MS);
+        try {
+            const response = await fetch(url, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Idempotency-Key': idempotencyKey
+                },
+                body: JSON.stringify(body),
+                signal: controller.signal
+            });
+            // 5xx is retried in case it was transient, but the last one is returned rather than
+            // thrown: the server was reached, so the sale must not be queued as offline
+            if (response.status < 500 || attempt === CHECKOUT_RETRIES) {
+                return response;
+            }
+        } catch (error) {
+            // Network failure or timeout
+            lastError = error;
+        } finally {
+            clearTimeout(timer);
+        }
+    }
+    throw lastError;
+}
+
 function showInvoiceModal(invoice) {
     const modal = new bootstrap.Modal(document.getElementById('invoiceModal'));
     const content = document.getElementById('invoiceContent');
@@ -342,37 +512,210 @@ function showInvoiceModal(invoice) {
     modal.show();
 }
 
-function filterProducts(query) {
-    document.querySelectorAll('.product-item').forEach(item => {
-        const card = item.querySelector('.product-card');
-        const product = JSON.parse(card.dataset.product);
-        const matches = product.name.toLowerCase().includes(query) || 
-                       product.barcode.toLowerCase().includes(query);
-        item.style.display = matches ? '' : 'none';
+function initProductGrid() {
+    const grid = document.getElementById('productGrid');
+    if (!grid) return;
+    
+    grid.addEventListener('scroll', () => requestAnimationFrame(renderProductGrid));
+    grid.addEventListener('click', function(e) {
+        const card = e.target.closest('.product-card');
+        if (card) {
+            addToCart(catalog.items[Number(card.dataset.index)]);
+        }
     });
+    window.addEventListener('resize', debounce(renderProductGrid, 100));
+    
+    loadProductPage();
 }
 
-function filterByCategory(category) {
-    document.querySelectorAll('.product-item').forEach(item => {
-        if (category === 'all') {
-            item.style.display = '';
-        } else {
-            const itemCategory = item.dataset.category;
-            item.style.display = itemCategory === category ? '' : 'none';
+function setCatalogFilter(changes) {
+    if (Object.keys(changes).every(key => catalog[key] === changes[key])) return;
+    
+    Object.assign(catalog, changes, {items: [], cursor: null, hasMore: true, loading: false});
+    catalog.generation++;
+    document.getElementById('productGrid').scrollTop = 0;
+    renderProductGrid();
+    loadProductPage();
+}
+
+async function loadProductPage() {
+    if (catalog.loading || !catalog.hasMore) return;
+    
+    catalog.loading = true;
+    const generation = catalog.generation;
+    const params = new URLSearchParams({per_page: GRID_PAGE_SIZE, in_stock: 1});
+    if (catalog.query) params.set('q', catalog.query);
+    if (catalog.category !== 'all') params.set('category', catalog.category);
+    if (catalog.cursor) params.set('cursor', catalog.cursor);
+    
+    try {
+        const response = await fetch(`/api/products/page?${params}`);
+        const page = await response.json();
+        // A newer search or category replaced this listing while the request was in flight
+        if (generation !== catalog.generation) return;
+        catalog.items.push(...page.items);
+        catalog.cursor = page.next_cursor;
+        catalog.hasMore = page.has_next;
+    } catch (error) {
+        console.error('Product load error:', error);
+        if (generation === catalog.generation) catalog.hasMore = false;
+    } finally {
+        if (generation === catalog.generation) {
+            catalog.loading = false;
+            renderProductGrid();
+        }
+    }
+}
+
+function gridColumns(width) {
+    return width >= 720 ? 3 : width >= 420 ? 2 : 1;
+}
+
+function renderProductGrid() {
+    const grid = document.getElementById('productGrid');
+    if (!grid) return;
+    
+    const columns = gridColumns(grid.clientWidth);
+    const rows = Math.ceil(catalog.items.length / columns);
+    document.getElementById('productGridSpacer').style.height = `${rows * GRID_ROW_HEIGHT}px`;
+    
+    const firstRow = Math.max(0, Math.floor(grid.scrollTop / GRID_ROW_HEIGHT) - GRID_OVERSCAN_ROWS);
+    const lastRow = Math.min(rows, Math.ceil((grid.scrollTop + grid.clientHeight) / GRID_ROW_HEIGHT) + GRID_OVERSCAN_ROWS);
+    const end = Math.min(lastRow * columns, catalog.items.length);
+    const width = 100 / columns;
+    
+    let html = '';
+    for (let index = firstRow * columns; index < end; index++) {
+        const top = Math.floor(index / columns) * GRID_ROW_HEIGHT;
+        const left = (index % columns) * width;
+        html += `
+            <div class="product-grid-item" style="top: ${top}px; left: ${left}%; width: ${width}%; height: ${GRID_ROW_HEIGHT}px;">
+                ${productCardHtml(catalog.items[index], index)}
+            </div>
+        `;
+    }
+    document.getElementById('productGridItems').innerHTML = html;
+    
+    // Fetch the next page before the user scrolls into empty space
+    if (catalog.hasMore && end >= catalog.items.length - columns * GRID_OVERSCAN_ROWS) {
+        loadProductPage();
+    }
+    updateGridStatus();
+}
+
+function productCardHtml(product, index) {
+    const stockClass = product.quantity > 10 ? 'success' : product.quantity > 0 ? 'warning' : 'danger';
+    return `
+        <div class="card product-card" data-index="${index}">
+            <div class="card-body p-2">
+                <h6 class="card-title mb-1 text-truncate">${escapeHtml(product.name)}</h6>
+                <p class="card-text mb-1">
+                    <small class="text-muted">${escapeHtml(product.barcode)}</small>
+                </p>
+                <div class="d-flex justify-content-between align-items-center">
+                    <span class="fw-bold text-primary">Rs. ${product.price.toLocaleString('en-PK', {minimumFractionDigits: 2})}</span>
+                    <span class="badge bg-${stockClass}">${product.quantity} in stock</span>
+                </div>
+            </div>
+        </div>
+    `;
+}
+
+function updateGridStatus() {
+    const status = document.getElementById('productGridStatus');
+    if (catalog.loading && catalog.items.length === 0) {
+        status.textContent = 'Loading products...';
+    } else if (catalog.items.length === 0) {
+        status.textContent = 'No products found';
+    } else {
+        status.textContent = `${catalog.items.length} products` + (catalog.hasMore ? ' loaded, scroll for more' : '');
+    }
+}
+
+function initCustomerTypeahead() {
+    const input = document.getElementById('customerSearch');
+    const results = document.getElementById('customerResults');
+    if (!input) return;
+    
+    let latestRequest = 0;
+    input.addEventListener('input', debounce(async function() {
+        document.getElementById('customerSelect').value = '';
+        const query = this.value.trim();
+        const request = ++latestRequest;
+        if (query.length < 2) {
+            results.classList.add('d-none');
+            return;
+        }
+        
+        try {
+            const response = await fetch(`/api/customers/search?q=${encodeURIComponent(query)}`);
+            const customers = await response.json();
+            if (request === latestRequest) {
+                renderCustomerResults(customers);
+            }
+        } catch (error) {
+            console.error('Customer search error:', error);
+        }
+    }, 250));
+    
+    results.addEventListener('click', function(e) {
+        const item = e.target.closest('[data-customer-id]');
+        if (item) {
+            selectCustomer(item.dataset.customerId, item.dataset.label);
         }
     });
+    
+    document.getElementById('clearCustomer').addEventListener('click', () => selectCustomer('', ''));
+    document.addEventListener('click', function(e) {
+        if (!e.target.closest('.customer-typeahead')) {
+            results.classList.add('d-none');
+        }
+    });
+}
+
+function renderCustomerResults(customers) {
+    const results = document.getElementById('customerResults');
+    if (customers.length === 0) {
+        results.innerHTML = '<div class="list-group-item text-muted">No customers found</div>';
+    } else {
+        results.innerHTML = customers.map(customer => {
+            const label = escapeHtml(`${customer.name} (${customer.mobile})`);
+            return `<button type="button" class="list-group-item list-group-item-action" data-customer-id="${customer.id}" data-label="${label}">${label}</button>`;
+        }).join('');
+    }
+    results.classList.remove('d-none');
+}
+
+function selectCustomer(id, label) {
+    document.getElementById('customerSelect').value = id;
+    document.getElementById('customerSearch').value = label;
+    document.getElementById('customerResults').classList.add('d-none');
+}
+
+function escapeHtml(value) {
+    const entities = {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'};
+    return String(value == null ? '' : value).replace(/[&<>"']/g, ch => entities[ch]);
 }
 
 async function searchAndAddProduct(query) {
     try {
+        const scanned = await fetch(`/api/products/barcode/${encodeURIComponent(query)}`);
+        if (scanned.ok) {
+            addToCart(await scanned.json());
+            document.getElementById('productSearch').value = '';
+            setCatalogFilter({query: ''});
+            return;
+        }
+        
         const response = await fetch(`/api/products/search?q=${encodeURIComponent(query)}`);
         const products = await response.json();
         
         if (products.length === 1) {
             addToCart(products[0]);
             document.getElementById('productSearch').value = '';
+            setCatalogFilter({query: ''});
         } else if (products.length > 1) {
-            filterProducts(query);
+            setCatalogFilter({query: query});
         } else {
             showToast('Product not found', 'error');
         }
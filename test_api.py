@@ -6,12 +6,14 @@ Run this script to test the API endpoints.
 
 import requests
 import json
+import sys
 
 BASE_URL = "http://localhost:5000"
 
 class APITester:
-    def __init__(self, base_url):
+    def __init__(self, base_url, use_token=True):
         self.base_url = base_url
+        self.use_token = use_token
         self.session = requests.Session()
     
     def login(self, username="admin", password="admin123"):
@@ -33,6 +35,26 @@ class APITester:
             print(f"[FAIL] Login failed: {response.status_code}")
             return False
     
+    def login_token(self, username="admin", password="admin123"):
+        """Get a bearer token and send it with every request"""
+        print(f"\n{'='*50}")
+        print("Testing POST /api/auth/token...")
+        print(f"{'='*50}")
+        
+        response = self.session.post(
+            f"{self.base_url}/api/auth/token",
+            json={"username": username, "password": password}
+        )
+        
+        if response.status_code == 200:
+            data = response.json()
+            self.session.headers["Authorization"] = f"Bearer {data['token']}"
+            print(f"[OK] Token issued for user: {username} (expires in {data['expires_in']}s)")
+            return True
+        else:
+            print(f"[FAIL] Token request failed: {response.status_code}")
+            return False
+    
     def test_get_products(self):
         """Test GET /api/products"""
         print(f"\n{'='*50}")
@@ -169,7 +191,8 @@ class APITester:
         print("   GROCERY STORE BILLING SYSTEM - API TEST SUITE")
         print("="*60)
         
-        if not self.login():
+        logged_in = self.login_token() if self.use_token else self.login()
+        if not logged_in:
             print("\n[ERROR] Cannot proceed without login")
             return
         
@@ -188,5 +211,6 @@ class APITester:
 
 
 if __name__ == "__main__":
-    tester = APITester(BASE_URL)
+    # Pass --session to authenticate with the login form and cookie instead of a token
+    tester = APITester(BASE_URL, use_token="--session" not in sys.argv)
     tester.run_all_tests()
@@ -0,0 +1,187 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from sqlalchemy import case, event, func
+
+from models import db, Category, Product, InventoryValue, dialect_insert
+
+VALUE_COLUMNS = ('stock_value', 'cost_value')
+TRACKED_ATTRIBUTES = ('is_active', 'category_id', 'quantity', 'price', 'cost_price')
+
+
+def category_key(category_id):
+    return int(category_id) if category_id else 0
+
+
+def new_deltas():
+    return defaultdict(lambda: [Decimal('0'), Decimal('0')])
+
+
+def add_value(deltas, category_id, quantity, price, cost_price, sign=1):
+    quantity = Decimal(str(quantity or 0)) * sign
+    values = deltas[category_key(category_id)]
+    values[0] += quantity * Decimal(str(price or 0))
+    values[1] += quantity * Decimal(str(cost_price or 0))
+
+
+def apply_value_deltas(deltas, connection=None):
+    # Same upsert as the daily_sales rollup; the connection is passed in from mapper events,
+    # which run inside a flush
+    execute = (connection or db.session).execute
+    table = InventoryValue.__table__
+    for key, (stock_value, cost_value) in deltas.items():
+        if not stock_value and not cost_value:
+            continue
+        values = {'category_key': key, 'stock_value': stock_value, 'cost_value': cost_value}
+        stmt = dialect_insert(table, connection)
+        if stmt is not None:
+            execute(stmt.values(**values).on_conflict_do_update(
+                index_elements=[table.c.category_key],
+                set_={column: table.c[column] + stmt.excluded[column] for column in VALUE_COLUMNS}
+            ))
+            continue
+        updated = execute(table.update().where(table.c.category_key == key).values(
+            {column: table.c[column] + values[column] for column in VALUE_COLUMNS}
+        )).rowcount
+        if not updated:
+            execute(table.insert().values(**values))
+
+
+def value_source(quantity=None):
+    # Per-category value of active products; `quantity` overrides the stock column, e.g. with
+    # the units a checkout just sold
+    table = Product.__table__
+    key = func.coalesce(table.c.category_id, 0)
+    quantity = table.c.quantity if quantity is None else quantity
+    return db.select(
+        key,
+        func.coalesce(func.sum(quantity * table.c.price), 0),
+        func.coalesce(func.sum(quantity * func.coalesce(table.c.cost_price, 0)), 0)
+    ).where(table.c.is_active == True).group_by(key)
+
+
+def record_stock_sold(quantities):
+    # Called right after reserve_stock, in the checkout transaction: one statement moves the
+    # value of the sold units out of their categories at current prices
+    table = Product.__table__
+    source = value_source(-case(quantities, value=table.c.id)).where(table.c.id.in_(sorted(quantities)))
+    stmt = dialect_insert(InventoryValue.__table__)
+    if stmt is not None:
+        stmt = stmt.from_select(['category_key'] + list(VALUE_COLUMNS), source)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[InventoryValue.__table__.c.category_key],
+            set_={column: InventoryValue.__table__.c[column] + stmt.excluded[column] for column in VALUE_COLUMNS}
+        ))
+        return
+    deltas = new_deltas()
+    for key, stock_value, cost_value in db.session.execute(source):
+        deltas[key] = [stock_value, cost_value]
+    apply_value_deltas(deltas)
+
+
+def import_value_deltas(rows, merge_columns=None):
+    # Net change from writing importer rows. With merge_columns, rows update an existing product
+    # by barcode: it keeps its own category and active flag, and any of quantity, price and
+    # cost_price not in merge_columns.
+    deltas = new_deltas()
+    existing = {}
+    if merge_columns is not None:
+        table = Product.__table__
+        existing = {row.barcode: row for row in db.session.execute(db.select(
+            table.c.barcode, table.c.is_active, table.c.category_id,
+            table.c.quantity, table.c.price, table.c.cost_price
+        ).where(table.c.barcode.in_([values['barcode'] for values in rows])))}
+    for values in rows:
+        old = existing.get(values['barcode'])
+        if old is None:
+            add_value(deltas, values['category_id'], values['quantity'], values['price'], values['cost_price'])
+        elif old.is_active:
+            new = {
+                column: values[column] if column in merge_columns else getattr(old, column)
+                for column in ('quantity', 'price', 'cost_price')
+            }
+            add_value(deltas, old.category_id, old.quantity, old.price, old.cost_price, sign=-1)
+            add_value(deltas, old.category_id, new['quantity'], new['price'], new['cost_price'])
+    return deltas
+
+
+def current_values():
+    return {
+        row.category_key: (round(row.stock_value, 2), round(row.cost_value, 2))
+        for row in InventoryValue.query.all()
+    }
+
+
+def rebuild_inventory_values():
+    # Recomputes the table from products and returns the categories whose stored totals had
+    # drifted, as {category_key: (stored, actual)}
+    table = InventoryValue.__table__
+    before = current_values()
+    if db.session.get_bind().dialect.name == 'postgresql':
+        # Checkouts wait for the rebuild instead of applying deltas to rows it is replacing
+        db.session.execute(db.text('LOCK TABLE inventory_values IN EXCLUSIVE MODE'))
+    db.session.execute(table.delete())
+    db.session.execute(table.insert().from_select(['category_key'] + list(VALUE_COLUMNS), value_source()))
+    db.session.commit()
+    after = current_values()
+    zero = (Decimal('0.00'), Decimal('0.00'))
+    return {
+        key: (before.get(key, zero), after.get(key, zero))
+        for key in before.keys() | after.keys()
+        if before.get(key, zero) != after.get(key, zero)
+    }
+
+
+def inventory_values():
+    rows = db.session.query(InventoryValue, Category.name).outerjoin(
+        Category, Category.id == InventoryValue.category_key
+    ).order_by(InventoryValue.stock_value.desc()).all()
+    categories = [{
+        'category_id': value.category_key or None,
+        'category_name': name or 'Uncategorized',
+        'stock_value': float(value.stock_value),
+        'cost_value': float(value.cost_value)
+    } for value, name in rows]
+    totals = {column: sum(category[column] for category in categories) for column in VALUE_COLUMNS}
+    return totals, categories
+
+
+def stored_product(connection, product_id):
+    table = Product.__table__
+    return connection.execute(db.select(
+        table.c.is_active, table.c.category_id, table.c.quantity, table.c.price, table.c.cost_price
+    ).where(table.c.id == product_id)).first()
+
+
+def _product_inserted(mapper, connection, target):
+    if target.is_active is not False:
+        deltas = new_deltas()
+        add_value(deltas, target.category_id, target.quantity, target.price, target.cost_price)
+        apply_value_deltas(deltas, connection)
+
+
+def _product_updating(mapper, connection, target):
+    # The stored row gives the old values even when an attribute was set without being loaded
+    state = db.inspect(target)
+    if not any(state.attrs[name].history.has_changes() for name in TRACKED_ATTRIBUTES):
+        return
+    old = stored_product(connection, target.id)
+    deltas = new_deltas()
+    if old is not None and old.is_active:
+        add_value(deltas, old.category_id, old.quantity, old.price, old.cost_price, sign=-1)
+    if target.is_active:
+        add_value(deltas, target.category_id, target.quantity, target.price, target.cost_price)
+    apply_value_deltas(deltas, connection)
+
+
+def _product_deleting(mapper, connection, target):
+    old = stored_product(connection, target.id)
+    if old is not None and old.is_active:
+        deltas = new_deltas()
+        add_value(deltas, old.category_id, old.quantity, old.price, old.cost_price, sign=-1)
+        apply_value_deltas(deltas, connection)
+
+
+event.listen(Product, 'after_insert', _product_inserted)
+event.listen(Product, 'before_update', _product_updating)
+event.listen(Product, 'before_delete', _product_deleting)